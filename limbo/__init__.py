@@ -1,3 +1,3 @@
-from .limbo import main, FakeServer, init_db, InvalidPluginDir
+from .limbo import main, FakeServer, init_db, init_plugins, InvalidPluginDir
 from .handlers import handle_message, run_hook
 from .fakeserver import FakeSlack
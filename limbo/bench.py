@@ -0,0 +1,188 @@
+"""Benchmarks of the paths every command goes through, run with
+`bin/limbo bench`.
+
+Each benchmark is timed at a few sizes against a synthetic account, with
+the Server Density API replaced by limbo.fakeclients, so only the
+bot's own work is measured. Results can be written as JSON and compared to
+an earlier run, failing when something got slower than the threshold.
+"""
+from __future__ import print_function
+import json
+import platform
+import time
+from datetime import timedelta
+
+from . import synthetic
+from .fakeclients import fake_server
+from .handlers import handle_event
+
+# slower than the baseline by more than this fraction is a regression
+THRESHOLD = 0.25
+
+BENCHMARKS = []
+
+
+def benchmark(name, sizes=(None,)):
+    """Register a setup function, which gets a size and returns the
+    function to time"""
+    def register(setup):
+        BENCHMARKS.append((name, sizes, setup))
+        return setup
+    return register
+
+
+def message(text):
+    return {'type': 'message', 'text': text, 'user': '2', 'channel': 'C1', 'ts': time.time()}
+
+
+@benchmark('handle_event.chatter')
+def bench_chatter(size):
+    server = fake_server()
+    event = message(u'anyone up for lunch?')
+    return lambda: handle_event(event, server)
+
+
+@benchmark('handle_event.devices')
+def bench_devices_command(size):
+    server = fake_server()
+    event = message(u'sdbot devices list 5')
+    return lambda: handle_event(event, server)
+
+
+@benchmark('clean_parsing')
+def bench_clean_parsing(size):
+    from .plugins.common.basewrapper import BaseWrapper
+    text = u'sdbot graph memory.memSwapFree for <http://web1.example.com|web1.example.com> from 2 hours ago'
+    return lambda: BaseWrapper.clean_parsing(text)
+
+
+@benchmark('metric_filter', sizes=(1, 3, 6))
+def bench_metric_filter(size):
+    from .plugins.common.basewrapper import BaseWrapper
+    wrapper = BaseWrapper(message(u''), fake_server())
+    path = ['level{0}'.format(n) for n in range(size)]
+    return lambda: wrapper.metric_filter(path)
+
+
+@benchmark('get_data', sizes=(60, 1440, 10080))
+def bench_get_data(size):
+    from .plugins.common.basewrapper import BaseWrapper
+    wrapper = BaseWrapper(message(u''), fake_server())
+    end = time.time()
+    data = synthetic.series({'memory': {'memSwapFree': 'all'}}, end - size * 60, end)
+    return lambda: wrapper.get_data(data)
+
+
+@benchmark('create_graph', sizes=(120, 1440, 10080, 100000))
+def bench_create_graph(size):
+    from .plugins.graph import Wrapper
+    wrapper = Wrapper(message(u''), fake_server())
+    end = time.time()
+    device, _ = wrapper.get_data(synthetic.series({'memory': {'memSwapFree': 'all'}},
+                                                  end - size * 60, end, size))
+    difference = timedelta(minutes=size)
+    return lambda: wrapper.create_graph(device, difference)
+
+
+@benchmark('devices.format', sizes=(10, 1000, 50000))
+def bench_format_devices(size):
+    from .plugins.devices import Wrapper
+    wrapper = Wrapper(message(u''), fake_server(devices=size))
+    devices = wrapper.inventory.devices()
+    return lambda: wrapper._format_devices(devices)
+
+
+@benchmark('devices.find', sizes=(10, 1000, 50000))
+def bench_find_device(size):
+    from .plugins.devices import Wrapper
+    wrapper = Wrapper(message(u''), fake_server(devices=size))
+    wrapper.inventory.devices()
+    return lambda: wrapper.find_device('device-1$')
+
+
+@benchmark('alerts.list', sizes=(10, 1000, 50000))
+def bench_list_alerts(size):
+    from .plugins.alerts import Wrapper
+    wrapper = Wrapper(message(u''), fake_server(devices=size, alerts=size))
+    wrapper.inventory.devices()
+    return lambda: wrapper.list_alerts('list', 'all', '')
+
+
+def measure(func, repeat=3, min_time=0.2, timer=time.time):
+    """Seconds per call of func, the best of repeat rounds of enough calls
+    to take about min_time each. Returns (seconds, calls per round)"""
+    start = timer()
+    func()
+    once = timer() - start
+    number = max(1, int(min_time / once)) if once > 0 else 1000
+    best = once
+    for _ in range(repeat):
+        start = timer()
+        for _ in range(number):
+            func()
+        best = min(best, (timer() - start) / number)
+    return best, number
+
+
+def run(only=None, repeat=3, min_time=0.2):
+    """Run the benchmarks whose name contains only, all of them if None.
+    Returns {"name[size]": {"name", "size", "seconds", "number"}}"""
+    results = {}
+    for name, sizes, setup in BENCHMARKS:
+        if only and only not in name:
+            continue
+        for size in sizes:
+            key = name if size is None else '{0}[{1}]'.format(name, size)
+            try:
+                func = setup(size)
+            except ImportError as e:
+                print('skipping {0}: {1}'.format(key, e))
+                continue
+            seconds, number = measure(func, repeat, min_time)
+            results[key] = {'name': name, 'size': size, 'seconds': seconds, 'number': number}
+            print('{0:<32} {1:>12.1f}us {2:>8} calls'.format(key, seconds * 1e6, number))
+    return results
+
+
+def regressions(results, baseline, threshold=THRESHOLD):
+    """[(key, baseline seconds, seconds)] of the results slower than the
+    baseline by more than threshold, and of the benchmarks in the baseline
+    that didn't run, with None for seconds"""
+    slower = []
+    for key, before in sorted(baseline.items()):
+        result = results.get(key)
+        if result is None:
+            slower.append((key, before['seconds'], None))
+        elif result['seconds'] > before['seconds'] * (1 + threshold):
+            slower.append((key, before['seconds'], result['seconds']))
+    return slower
+
+
+def main(args):
+    """Run the benchmarks for bin/limbo bench, returns the exit status"""
+    only = getattr(args, 'bench_filter', None)
+    results = run(only)
+    output = getattr(args, 'bench_output', None)
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'python': platform.python_version(), 'results': results},
+                      f, indent=2, sort_keys=True)
+
+    baseline = getattr(args, 'bench_baseline', None)
+    if not baseline:
+        return 0
+    with open(baseline) as f:
+        baseline = json.load(f)['results']
+    # the benchmarks left out by the filter aren't missing
+    baseline = dict((key, before) for key, before in baseline.items()
+                    if not only or only in before['name'])
+    threshold = getattr(args, 'bench_threshold', None)
+    threshold = THRESHOLD if threshold is None else threshold
+    slower = regressions(results, baseline, threshold)
+    for key, before, after in slower:
+        if after is None:
+            print('{0} is in the baseline but didn\'t run'.format(key))
+        else:
+            print('{0} regressed: {1:.1f}us -> {2:.1f}us ({3:+.0%})'.format(
+                key, before * 1e6, after * 1e6, after / before - 1))
+    return 1 if slower else 0
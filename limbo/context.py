@@ -0,0 +1,32 @@
+import threading
+
+
+class TenantContext(object):
+    """State that belongs to a single Slack team.
+
+    The plugin registry is shared by every bot in the process; anything a
+    bot builds up for its own team (API clients, caches, queues) is kept
+    here, keyed by name, and created on first use.
+    """
+    def __init__(self, resource=None):
+        self.resource = resource
+        self._state = {}
+        self._lock = threading.Lock()
+
+    @property
+    def resource_id(self):
+        if self.resource:
+            return self.resource.get("resourceID")
+
+    def get(self, key, factory):
+        """Return the value stored under key, calling factory() to create it
+        the first time it's asked for"""
+        try:
+            return self._state[key]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if key not in self._state:
+                self._state[key] = factory()
+            return self._state[key]
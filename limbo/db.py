@@ -0,0 +1,308 @@
+import logging
+import re
+import sqlite3
+import sys
+import threading
+import traceback
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logger = logging.getLogger(__name__)
+
+# stop marker for the writer thread
+_STOP = object()
+
+# statements that only read, by their main verb, these never go through
+# the writer
+READ_STATEMENTS = ("select", "values", "explain")
+# the verbs a WITH statement can end in
+MAIN_VERBS = ("select", "values", "insert", "replace", "update", "delete")
+# statements the writer runs on their own, outside its batch transaction
+OUTSIDE_STATEMENTS = ("pragma", "vacuum", "attach", "detach")
+# every write is committed by the writer, callers can't run their own
+# transactions through it
+TRANSACTION_STATEMENTS = ("begin", "commit", "end", "rollback", "savepoint", "release")
+
+
+def _first_word(sql):
+    words = sql.split(None, 1)
+    return words[0].lower() if words else ""
+
+
+# string literals and quoted names, so their contents are skipped, brackets
+# and words
+_TOKENS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|[()]|\w+")
+
+
+def _main_verb(sql):
+    """The first word of sql, or for a WITH the first verb after its common
+    table expressions, WITH x AS (SELECT ...) DELETE ... is a delete"""
+    word = _first_word(sql)
+    if word != "with":
+        return word
+    depth = 0
+    for token in _TOKENS.findall(sql):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif not depth and token.lower() in MAIN_VERBS:
+            return token.lower()
+    return word
+
+
+def is_read(sql):
+    return _main_verb(sql) in READ_STATEMENTS
+
+
+class _Write(object):
+    """A queued write, and what became of it once the writer ran it"""
+    __slots__ = ("sql", "params", "kind", "wanted", "thread", "rows", "error", "done")
+
+    def __init__(self, sql, params, kind, wanted):
+        self.sql = sql
+        self.params = params
+        # "one", "many" for executemany or "all" for executeall
+        self.kind = kind
+        # query() waits for this write and wants its rows and errors
+        self.wanted = wanted
+        self.thread = threading.current_thread().ident
+        self.rows = []
+        self.error = None
+        self.done = threading.Event()
+
+
+class Database(object):
+    """A SQLite database in WAL mode, shared by every thread of the bot.
+
+    Writes are queued to a single writer thread, which runs whatever has
+    piled up in one transaction, so a burst of inserts costs one commit
+    instead of one each. Reads run straight away on a connection per
+    thread, outside any transaction, so they never commit and never wait
+    for the writer, except that a read made while writes are queued waits
+    for the writes its own thread queued first, so callers always see what
+    they wrote without waiting on anyone else's.
+
+    A write that fails is raised from query() when that's how it was made,
+    and otherwise from the next flush() of the thread that queued it.
+
+    Every connection keeps up to cache_size compiled statements.
+    """
+    def __init__(self, path, batch_size=500, cache_size=256, timeout=10):
+        if path == ":memory:":
+            raise ValueError("an in-memory database can't be shared between connections, use a file")
+        self.path = path
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.timeout = timeout
+
+        self._local = threading.local()
+        self._writes = queue.Queue()
+        # writes queued and not yet committed, by the thread that queued them
+        self._pending = {}
+        self._flushed = threading.Condition(threading.Lock())
+        # the last failed write of every thread that queued one, by thread
+        self._errors = {}
+
+        # switch to WAL before any reader connects, it's a property of the file
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode = WAL")
+        # with WAL a commit only has to reach the log, fsync on checkpoints
+        self._writer.execute("PRAGMA synchronous = NORMAL")
+
+        self._thread = threading.Thread(target=self._write_loop, name="limbo-db-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _connect(self):
+        # isolation_level None: no implicit transactions, the writer opens
+        # its own and readers don't keep one open between queries
+        return sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                               check_same_thread=False, cached_statements=self.cache_size)
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute("PRAGMA query_only = 1")
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql, *params):
+        """Queue a write, it's committed with the next batch"""
+        self._queue(sql, params, "one")
+
+    def executemany(self, sql, seq_of_params):
+        """Queue a write for every set of params, committed together"""
+        self._queue(sql, list(seq_of_params), "many")
+
+    def executeall(self, statements):
+        """Queue [(sql, params)] as one write: the writer runs them one
+        after the other with nothing in between, and if one fails none of
+        them is kept. For a write that depends on what's in the database"""
+        statements = [(sql, tuple(params)) for sql, params in statements]
+        for sql, _ in statements:
+            self._check(sql)
+        self._queue("; ".join(sql for sql, _ in statements), statements, "all")
+
+    def _check(self, sql):
+        if _first_word(sql) in TRANSACTION_STATEMENTS:
+            raise ValueError("the writer commits every write itself, use executemany "
+                             "or executeall to commit several together: {0!r}".format(sql))
+
+    def _queue(self, sql, params, kind, wanted=False):
+        self._check(sql)
+        write = _Write(sql, params, kind, wanted)
+        with self._flushed:
+            self._pending[write.thread] = self._pending.get(write.thread, 0) + 1
+        self._writes.put(write)
+        return write
+
+    def _wait(self):
+        thread = threading.current_thread().ident
+        with self._flushed:
+            while self._pending.get(thread):
+                self._flushed.wait()
+
+    def flush(self):
+        """Wait until every write this thread queued so far is committed,
+        and raise the error of the last one of them that failed"""
+        self._wait()
+        error = self._errors.pop(threading.current_thread().ident, None)
+        if error is not None:
+            raise error
+
+    def iterquery(self, sql, *params):
+        """Yield the rows of a read one at a time instead of loading them
+        all"""
+        self._wait()
+        cursor = self._reader().cursor()
+        try:
+            cursor.execute(sql, params)
+            for row in cursor:
+                yield row
+        finally:
+            cursor.close()
+
+    def query(self, sql, *params):
+        """Run sql and return its rows. Reads run right away; anything else,
+        PRAGMA included, is run by the writer, which this waits for, and
+        raises if it failed"""
+        if is_read(sql):
+            return list(self.iterquery(sql, *params))
+        write = self._queue(sql, params, "one", wanted=True)
+        write.done.wait()
+        if write.error is not None:
+            raise write.error
+        return write.rows
+
+    def close(self):
+        self._writes.put(_STOP)
+        self._thread.join()
+        self._writer.close()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._writes.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            batch = [write for write in batch if write is not _STOP]
+            if batch:
+                self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch):
+        transaction = []
+        try:
+            for write in batch:
+                outside = _first_word(write.sql) in OUTSIDE_STATEMENTS
+                if outside and transaction:
+                    self._commit(transaction)
+                    transaction = []
+                elif not outside and not transaction:
+                    try:
+                        self._writer.execute("BEGIN")
+                    except sqlite3.Error as e:
+                        self._failed(write, e)
+                        continue
+                self._run(write)
+                if not outside:
+                    transaction.append(write)
+            if transaction:
+                self._commit(transaction)
+        finally:
+            with self._flushed:
+                for write in batch:
+                    self._pending[write.thread] -= 1
+                    if not self._pending[write.thread]:
+                        del self._pending[write.thread]
+                self._flushed.notify_all()
+            for write in batch:
+                write.done.set()
+
+    def _run(self, write):
+        try:
+            if write.kind == "one":
+                cursor = self._writer.execute(write.sql, write.params)
+                if write.wanted:
+                    write.rows = cursor.fetchall()
+                return
+            # the rest of the batch is kept if one of these fails half way,
+            # so undo the part that ran
+            self._writer.execute("SAVEPOINT write")
+            try:
+                if write.kind == "many":
+                    self._writer.executemany(write.sql, write.params)
+                else:
+                    for sql, params in write.params:
+                        self._writer.execute(sql, params)
+            except Exception:
+                self._writer.execute("ROLLBACK TO write")
+                raise
+            finally:
+                self._writer.execute("RELEASE write")
+        except Exception as e:
+            self._failed(write, e)
+
+    def _commit(self, transaction):
+        try:
+            self._writer.execute("COMMIT")
+        except Exception as e:
+            logger.warning("Failed to commit {0} writes".format(len(transaction)))
+            try:
+                self._writer.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            for write in transaction:
+                if write.error is None:
+                    self._failed(write, e)
+
+    def _failed(self, write, error):
+        logger.warning("Failed to run {0!r}".format(write.sql))
+        logger.warning("{0}".format(sys.exc_info()[0]))
+        logger.warning("{0}".format(traceback.format_exc()))
+        write.error = error
+        write.rows = []
+        if not write.wanted:
+            self._errors[write.thread] = error
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path):
+    """Return the shared Database for the file at path, every bot in the
+    process writes through the same writer thread"""
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = Database(path)
+        return _databases[path]
@@ -0,0 +1,99 @@
+import logging
+import sys
+import threading
+import traceback
+import zlib
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .handlers import handle_event
+
+logger = logging.getLogger(__name__)
+
+# stop marker for the worker threads
+_STOP = object()
+
+
+def event_channel(event):
+    """Return the id of the channel an event happened in, or None"""
+    channel = event.get("channel")
+    if isinstance(channel, dict):
+        return channel.get("id")
+    return channel
+
+
+class Dispatcher(object):
+    """Runs events through the plugin hooks on a pool of worker threads, so
+    that one slow command doesn't hold up the RTM loop.
+
+    Every channel is pinned to one worker, which keeps the replies of a
+    channel in the order its messages came in. Each worker has a bounded
+    queue; events that arrive while it is full are dropped with a warning.
+
+    With workers=0 events are handled inline on the calling thread.
+    """
+    def __init__(self, server, workers=4, queue_size=100):
+        self.server = server
+        self.workers = workers
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.threads = []
+
+    def start(self):
+        for n, q in enumerate(self.queues):
+            thread = threading.Thread(target=self._work, args=(q,),
+                                      name="limbo-worker-{0}".format(n))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        for q in self.queues:
+            q.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def dispatch(self, event):
+        """Queue an event for handling. Returns False if it was dropped"""
+        if not self.workers:
+            self.handle(event)
+            return True
+
+        q = self.queues[self._shard(event)]
+        try:
+            q.put_nowait(event)
+        except queue.Full:
+            logger.warning("worker queue full, dropping {0} event".format(event.get("type")))
+            return False
+        return True
+
+    def pending(self):
+        return sum(q.qsize() for q in self.queues)
+
+    def _shard(self, event):
+        channel = event_channel(event) or ""
+        return zlib.crc32(channel.encode("utf8")) % self.workers
+
+    def _work(self, q):
+        while True:
+            event = q.get()
+            try:
+                if event is _STOP:
+                    return
+                self.handle(event)
+            finally:
+                q.task_done()
+
+    def handle(self, event):
+        try:
+            response = handle_event(event, self.server)
+            if response:
+                self.server.outbox.send(event_channel(event), response)
+        # like run_hook, a failing event must not take the worker down
+        except:
+            logger.warning("Failed to handle event {0}".format(event.get("type")))
+            logger.warning("{0}".format(sys.exc_info()[0]))
+            logger.warning("{0}".format(traceback.format_exc()))
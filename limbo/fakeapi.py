@@ -0,0 +1,224 @@
+"""A stand-in for api.serverdensity.io, serving a synthetic account from
+limbo.synthetic, for load testing the plugins without the real API.
+
+Start it with `bin/limbo fakeapi` and point the bot at it with
+LIMBO_SD_API_URL=http://127.0.0.1:8765/. Every answer can be slowed down by
+a latency with some jitter, a share of the requests can fail with a 500,
+and the size of the answers can be raised with more metric points and
+padding on every inventory item.
+"""
+from __future__ import print_function
+import json
+import logging
+import random
+import re
+import threading
+import time
+import zlib
+from datetime import datetime
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+from . import synthetic
+
+logger = logging.getLogger(__name__)
+
+PORT = 8765
+
+
+class Account(object):
+    """The synthetic inventory, alerts and series the fake API serves"""
+    def __init__(self, devices=100, services=10, alerts=50, points=None, padding=0, seed=0):
+        self.devices = synthetic.devices(devices, seed)
+        self.services = synthetic.services(services, seed)
+        self.alerts = synthetic.alerts(alerts, self.devices + self.services, seed)
+        self.points = points
+        self.seed = seed
+        if padding:
+            # makes every item, and so every answer, bigger
+            for item in self.devices + self.services:
+                item['padding'] = 'x' * padding
+        self.by_id = dict((item['_id'], item) for item in self.devices + self.services)
+
+
+def _timestamp(value):
+    """A unix timestamp from the ISO dates the wrapper sends, the timezone
+    is ignored"""
+    return time.mktime(datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S').timetuple())
+
+
+def _json_param(query, name, default):
+    try:
+        return json.loads(query[name][0])
+    except (KeyError, ValueError):
+        return default
+
+
+def _matches(item, filter):
+    """Whether an item matches a Server Density filter of dotted paths to
+    exact values or {"$regex": ...}"""
+    for path, wanted in filter.items():
+        value = item
+        for part in path.split('.'):
+            value = value.get(part) if isinstance(value, dict) else None
+        if isinstance(wanted, dict) and '$regex' in wanted:
+            if value is None or not re.search(wanted['$regex'], str(value)):
+                return False
+        elif value != wanted:
+            return False
+    return True
+
+
+class FakeApi(object):
+    """The routes of the API, each answering (status, body) for a parsed
+    query string"""
+    def __init__(self, account):
+        self.account = account
+        self.routes = [
+            (r'^/inventory/devices/?$', self.devices),
+            (r'^/inventory/devices/(\w+)$', self.item),
+            (r'^/inventory/services/?$', self.services),
+            (r'^/inventory/services/(\w+)$', self.item),
+            (r'^/inventory/resources/?$', self.resources),
+            (r'^/metrics/definitions/(\w+)$', self.definitions),
+            (r'^/metrics/graphs/(\w+)$', self.graphs),
+            (r'^/alerts/triggered/?$', self.triggered),
+            (r'^/service-monitor/nodes/?$', self.nodes),
+            (r'^/service-monitor/last/(\w+)$', self.last),
+        ]
+        self.routes = [(re.compile(pattern), route) for pattern, route in self.routes]
+
+    def answer(self, path, query):
+        for pattern, route in self.routes:
+            match = pattern.match(path)
+            if match:
+                return route(query, *match.groups())
+        return 404, {'message': 'no such endpoint {0}'.format(path)}
+
+    def devices(self, query):
+        return 200, self.account.devices
+
+    def services(self, query):
+        return 200, self.account.services
+
+    def item(self, query, _id):
+        item = self.account.by_id.get(_id)
+        if item is None:
+            return 404, {'message': 'not found'}
+        return 200, item
+
+    def resources(self, query):
+        filter = _json_param(query, 'filter', {})
+        items = self.account.devices + self.account.services
+        return 200, [item for item in items if _matches(item, filter)]
+
+    def definitions(self, query, _id):
+        return 200, synthetic.available()
+
+    def graphs(self, query, _id):
+        try:
+            start = _timestamp(query['start'][0])
+            end = _timestamp(query['end'][0])
+        except (KeyError, ValueError):
+            return 400, {'message': 'start and end are required'}
+        filter = _json_param(query, 'filter', {})
+        seed = zlib.crc32(_id.encode('utf8')) + self.account.seed
+        return 200, synthetic.series(filter, start, end, self.account.points, seed)
+
+    def triggered(self, query):
+        filter = _json_param(query, 'filter', {})
+        return 200, [alert for alert in self.account.alerts if _matches(alert, filter)]
+
+    def nodes(self, query):
+        return 200, synthetic.nodes()
+
+    def last(self, query, _id):
+        service = self.account.by_id.get(_id)
+        if service is None:
+            return 404, {'message': 'not found'}
+        return 200, synthetic.statuses(service, self.account.seed)
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    # set on the subclass serve() makes
+    api = None
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    rng = random.Random()
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.respond()
+
+    def respond(self):
+        url = urlparse(self.path)
+        delay = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.rng.random() < self.error_rate:
+            status, body = 500, {'message': 'injected error'}
+        else:
+            status, body = self.api.answer(url.path, parse_qs(url.query))
+
+        payload = json.dumps(body).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def serve(account, port=PORT, host='127.0.0.1', latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+    """Start serving account from a background thread and return the
+    server, its address is server.server_address"""
+    handler = type('Handler', (FakeApiHandler,), {
+        'api': FakeApi(account),
+        'latency': latency,
+        'jitter': jitter,
+        'error_rate': error_rate,
+        'rng': random.Random(seed),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name='limbo-fakeapi')
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def main(args):
+    """Run the fake API for bin/limbo fakeapi until interrupted"""
+    account = Account(devices=args.fakeapi_devices,
+                      services=args.fakeapi_services,
+                      alerts=args.fakeapi_alerts,
+                      points=args.fakeapi_points,
+                      padding=args.fakeapi_padding)
+    server = serve(account,
+                   port=args.fakeapi_port,
+                   latency=args.fakeapi_latency,
+                   jitter=args.fakeapi_jitter,
+                   error_rate=args.fakeapi_error_rate)
+    host, port = server.server_address[:2]
+    print('Fake Server Density API on http://{0}:{1}/, set LIMBO_SD_API_URL to use it'.format(host, port))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
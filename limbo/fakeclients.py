@@ -0,0 +1,66 @@
+"""Stand-ins for ClientRegistry and the Server Density API it hands out,
+answering from a synthetic account in memory. The benchmarks run against
+these, and so can tests that need a wrapper without any HTTP."""
+import time
+
+from . import synthetic
+from .context import TenantContext
+from .fakeserver import FakeServer
+from .registry import get_registry
+
+
+class Listing(object):
+    def __init__(self, items):
+        self.items = items
+
+    def list(self):
+        return self.items
+
+
+class Alerts(object):
+    def __init__(self, alerts):
+        self.alerts = alerts
+
+    def triggered(self, params=None):
+        return self.alerts
+
+
+class Metrics(object):
+    def __init__(self, points):
+        self.points = points
+
+    def get(self, _id, start, end, filter):
+        return synthetic.series(filter, time.mktime(start.timetuple()),
+                                time.mktime(end.timetuple()), self.points)
+
+    def available(self, _id, start, end):
+        return synthetic.available()
+
+
+class FakeApi(object):
+    def __init__(self, devices=10, alerts=10, points=None):
+        self.devices = Listing(synthetic.devices(devices))
+        self.services = Listing(synthetic.services(max(devices // 10, 1)))
+        self.alerts = Alerts(synthetic.alerts(alerts, self.devices.items))
+        self.metrics = Metrics(points)
+
+
+class FakeClients(object):
+    """Stands in for ClientRegistry, every thread gets the same FakeApi"""
+    base_url = None
+
+    def __init__(self, api, session=None):
+        self._api = api
+        self.session = session
+
+    def api(self):
+        return self._api
+
+
+def fake_server(devices=10, alerts=10, points=None, clients=None):
+    """A FakeServer whose wrappers get clients, by default FakeClients of
+    a synthetic account of this size"""
+    context = TenantContext()
+    context.get('sd_clients', lambda: clients or FakeClients(FakeApi(devices, alerts, points)))
+    config = {'resource': {'SD_AUTH_TOKEN': 'bench'}}
+    return FakeServer(config=config, hooks=get_registry().hooks, context=context)
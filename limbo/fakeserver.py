@@ -1,22 +1,39 @@
 from slackrtm.server import User, Bot
 
+from .context import TenantContext
+from .outbox import Outbox
+
 class FakeServer(object):
-    def __init__(self, slack=None, config=None, hooks=None, db=None):
+    def __init__(self, slack=None, config=None, hooks=None, db=None, context=None):
         self.slack = slack or FakeSlack()
         self.config = config
         self.hooks = hooks
         self.db = db
+        self.context = context or TenantContext()
+        self.web = FakeSlackWeb()
+        self.outbox = Outbox(self.web, self.slack)
 
     def query(self, sql, *params):
         if not self.db:
             return None
+        return self.db.query(sql, *params)
+
+    def iterquery(self, sql, *params):
+        if not self.db:
+            return iter([])
+        return self.db.iterquery(sql, *params)
+
+    def execute(self, sql, *params):
+        if self.db:
+            self.db.execute(sql, *params)
+
+    def executemany(self, sql, seq_of_params):
+        if self.db:
+            self.db.executemany(sql, seq_of_params)
 
-        c = self.db.cursor()
-        c.execute(sql, params)
-        rows = c.fetchall()
-        c.close()
-        self.db.commit()
-        return rows
+    def executeall(self, statements):
+        if self.db:
+            self.db.executeall(statements)
 
 class FakeSlack(object):
     def __init__(self, server=None, users=None, events=None):
@@ -30,6 +47,20 @@ class FakeSlack(object):
     def rtm_read(self):
         return self.events.pop() if self.events else []
 
+class FakeSlackWeb(object):
+    def __init__(self):
+        self.posted_messages = []
+        self.uploads = []
+        self.timings = {}
+
+    def post_message(self, channel, message, **kwargs):
+        self.posted_messages.append((channel, message, kwargs))
+        return {"ok": True}
+
+    def upload(self, fileobj, filename, channels, **kwargs):
+        self.uploads.append((fileobj.read(), filename, channels))
+        return {"ok": True, "file": {"permalink": "https://files.example/{0}".format(filename)}}
+
 class FakeSlackServer(object):
     def __init__(self, botname="limbo_test", users=None, bots=None, events=None):
         self.login_data = {
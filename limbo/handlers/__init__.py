@@ -1,11 +1,48 @@
 import json
 import logging
+import re
 import sys
+import time
 import traceback
 
+from ..stats import STATS
+
 logger = logging.getLogger(__name__)
 
 
+class CommandRouter(object):
+    """Picks the message hooks that should see a message.
+
+    Plugins declare the words that follow `sdbot` in their commands in a
+    module level TRIGGERS list. The router matches the prefix once per
+    message and looks the command word up in a dict, so ordinary chatter
+    only reaches the plugins that don't declare TRIGGERS.
+    """
+    PREFIX = re.compile(r"^[sS][dD][bB]ot\b\s*(\w*)")
+
+    def __init__(self):
+        self.commands = {}
+        self.catchall = []
+
+    def add(self, hook, triggers=None):
+        if triggers is None:
+            self.catchall.append(hook)
+            return
+        for word in triggers:
+            self.commands.setdefault(word, []).append(hook)
+
+    def command(self, text):
+        """The command word of a message, None if it isn't for the bot"""
+        match = self.PREFIX.match(text)
+        return match.group(1) if match else None
+
+    def route(self, text):
+        command = self.command(text)
+        if command is None:
+            return self.catchall
+        return self.commands.get(command, []) + self.catchall
+
+
 def handle_bot_message(event, server):
     try:
         bot = server.slack.server.bots[event["bot_id"]]
@@ -30,7 +67,19 @@ def handle_message(event, server):
         logger.debug("event {0} has no user".format(event))
         return
 
-    return "\n".join(run_hook(server.hooks, "message", event, server))
+    text = event.get("text", "")
+    router = server.hooks.get("router")
+    if router:
+        hooks = router.route(text)
+        command = router.command(text)
+        # only words some plugin answers to get timings of their own, so
+        # typos don't each make a new series
+        if command not in router.commands:
+            command = None
+    else:
+        hooks = server.hooks.get("message", [])
+        command = None
+    return "\n".join(run_hooks(hooks, event, server, command=command or "message"))
 
 
 def handle_channel_joined(event, server):
@@ -51,16 +100,31 @@ event_handlers = {
 
 
 def run_hook(hooks, hook, *args):
+    return run_hooks(hooks.get(hook, []), *args, command=hook)
+
+
+def run_hooks(hooks, *args, **kwargs):
+    """Run every hook and collect their responses. Each run is timed in
+    STATS by plugin and command, the command being the word after `sdbot`
+    for messages and the hook name otherwise"""
+    command = kwargs.get("command", "")
     responses = []
-    for hook in hooks.get(hook, []):
+    for hook in hooks:
+        start = time.time()
+        ok = False
         try:
             h = hook(*args)
+            ok = True
             if h:
                 responses.append(h)
         except:
             logger.warning("Failed to run plugin {0}, module not loaded".format(hook))
             logger.warning("{0}".format(sys.exc_info()[0]))
             logger.warning("{0}".format(traceback.format_exc()))
+        finally:
+            STATS.record("limbo_plugin_seconds",
+                         (("plugin", getattr(hook, "__module__", str(hook))), ("command", command)),
+                         time.time() - start, ok)
     return responses
 
 
@@ -1,17 +1,13 @@
 #!/usr/bin/env python
 from __future__ import print_function
-import copy
 import functools
-from glob import glob
-import importlib
 import logging
 import os
-import re
-import sqlite3
+import select
+import socket
 import sys
 import time
 import traceback
-import json
 
 from slackrtm import SlackClient
 from slackrtm.server import SlackConnectionError, SlackLoginError
@@ -21,12 +17,17 @@ from beepboop import bot_manager
 
 from .server import LimboServer
 from .fakeserver import FakeServer
+from .context import TenantContext
+from .db import get_database
+from .registry import get_registry, InvalidPluginDir
 
+from .dispatcher import Dispatcher
+from . import stats
+from .profiling import profile
 from .handlers import handle_event, bb_handlers, run_hook
 from .utils import (decode,
                     encode,
-                    relevant_environ,
-                    strip_extension)
+                    relevant_environ)
 from .settings import CONFIG
 
 
@@ -35,17 +36,22 @@ DIR = functools.partial(os.path.join, CURDIR)
 
 logger = logging.getLogger(__name__)
 
-
-class InvalidPluginDir(Exception):
-    def __init__(self, plugindir):
-        message = "Unable to find plugin dir {0}".format(plugindir)
-        super(InvalidPluginDir, self).__init__(message)
+# How often, in seconds, the loop hooks run
+LOOP_INTERVAL = 1
+# The Slack RTM API docs say:
+#
+# > When there is no other activity clients should send a ping
+# > every few seconds
+#
+# So, if we've gone this many seconds without any activity, send a ping.
+PING_INTERVAL = 5
 
 
 class Slackbot(object):
     def __init__(self, bot_token=None, ServerClass=LimboServer, Client=SlackClient, config=CONFIG):
         self.resource = None
         self.server = None
+        self.dispatcher = None
         if bot_token:
             # using resource if no token
             self.token = bot_token
@@ -54,79 +60,19 @@ class Slackbot(object):
         self.Client = Client
         self.config = config
 
-        self._init_log(config)
+        init_log(config)
         logger.debug("config: {0}".format(config))
-        config_plugins = config.get("plugins")
-        plugins_to_load = config_plugins.split(",") if config_plugins else []
 
         # disable custom plugindir for now. In the future, input that through
-        # config instead. Replace None with something else later
-        self.hooks = self._init_plugins(None, plugins_to_load)
-
-    def _init_log(self, config):
-        loglevel = config.get("loglevel", logging.INFO)
-        logformat = config.get("logformat", '%(asctime)s:%(levelname)s:%(name)s:%(message)s')
-        if config.get("logfile"):
-            logging.basicConfig(filename=config.get("logfile"), format=logformat, level=loglevel)
-        else:
-            logging.basicConfig(format=logformat, level=loglevel)
-
-    def _init_plugins(self, plugindir, plugins_to_load=None):
-        if plugindir and not os.path.isdir(plugindir):
-            raise InvalidPluginDir(plugindir)
-
-        if not plugindir:
-            plugindir = DIR("plugins")
+        # config instead. Replace None with something else later.
+        # Every bot in the process shares the same registry, so BeepBoop
+        # tenants after the first one don't import anything.
+        self.registry = get_registry(None, config.get("plugins"))
+        self.hooks = self.registry.hooks
+        init_graph_pool(self.registry)
 
-        logger.debug("plugindir: {0}".format(plugindir))
-
-        if os.path.isdir(plugindir):
-            pluginfiles = glob(os.path.join(plugindir, "[!_]*.py"))
-            plugins = strip_extension(os.path.basename(p) for p in pluginfiles)
-        else:
-            # we might be in an egg; try to get the files that way
-            logger.debug("trying pkg_resources")
-            import pkg_resources
-            try:
-                plugins = strip_extension(
-                        pkg_resources.resource_listdir(__name__, "plugins"))
-            except OSError:
-                raise InvalidPluginDir(plugindir)
-
-        hooks = {}
-
-        oldpath = copy.deepcopy(sys.path)
-        sys.path.insert(0, plugindir)
-
-        for plugin in plugins:
-            if plugins_to_load and plugin not in plugins_to_load:
-                logger.debug("skipping plugin {0}, not in plugins_to_load {1}".format(plugin, plugins_to_load))
-                continue
-
-            logger.debug("plugin: {0}".format(plugin))
-            try:
-                mod = importlib.import_module(plugin)
-                modname = mod.__name__
-                for hook in re.findall("on_(\w+)", " ".join(dir(mod))):
-                    hookfun = getattr(mod, "on_" + hook)
-                    logger.debug("plugin: attaching %s hook for %s", hook, modname)
-                    hooks.setdefault(hook, []).append(hookfun)
-
-                if mod.__doc__:
-                    # firstline = mod.__doc__.split('\n')[0]
-                    part_attachment = json.loads(mod.__doc__)
-                    hooks.setdefault('help', {})[modname] = part_attachment
-                    hooks.setdefault('extendedhelp', {})[modname] = mod.__doc__
-
-            # bare except, because the modules could raise any number of errors
-            # on import, and we want them not to kill our server
-            except:
-                logger.warning("import failed on module {0}, module not loaded".format(plugin))
-                logger.warning("{0}".format(sys.exc_info()[0]))
-                logger.warning("{0}".format(traceback.format_exc()))
-
-        sys.path = oldpath
-        return hooks
+        if config.get("stats_port"):
+            stats.serve(int(config["stats_port"]), config.get("stats_host", "127.0.0.1"))
 
     def start(self, resource=None):
         if resource:
@@ -140,71 +86,141 @@ class Slackbot(object):
         else:
             slack = self.Client(self.token)
             config = dict(self.config)
+        context = TenantContext(self.resource)
 
-        # Currently not supporting a database, might do later
-        self.server = self.ServerClass(slack, config, self.hooks, None)
+        # the database is optional, it keeps downloaded metrics across restarts
+        db = init_db(config["database"]) if config.get("database") else None
+        self.server = self.ServerClass(slack, config, self.hooks, db, context)
         self.server.slack.rtm_connect()
+        self.server.outbox.start()
+        self.dispatcher = self._init_dispatcher(self.server, config)
+        self.dispatcher.start()
         self.loop()
 
+    def _init_dispatcher(self, server, config):
+        workers = int(config.get("workers", 4))
+        queue_size = int(config.get("queue_size", 100))
+        logger.debug("dispatching on {0} workers, queue size {1}".format(workers, queue_size))
+        return Dispatcher(server, workers, queue_size)
+
     def stop(self, resource):
         logger.debug("Stopped Bot for ResourceID: {}".format(
             self.resource['resourceID'])
         )
+        if self.dispatcher:
+            self.dispatcher.stop()
+        self.server.outbox.stop()
         self.server.slack = None
         # close connection to slack.
 
+    def _websocket_sock(self):
+        """Return the raw socket behind the RTM websocket, or None if there
+        isn't one (when running against a FakeSlack, for example)"""
+        websocket = getattr(self.server.slack.server, "websocket", None)
+        return getattr(websocket, "sock", None)
+
+    def _wait_for_events(self, timeout):
+        """Block until the RTM websocket has data to read, or until timeout
+        seconds have passed"""
+        timeout = max(timeout, 0)
+        sock = self._websocket_sock()
+        if sock is None:
+            time.sleep(timeout)
+            return
+
+        # an SSL socket may already hold decrypted data that select can't see
+        pending = getattr(sock, "pending", None)
+        if pending and pending():
+            return
+
+        try:
+            select.select([sock], [], [], timeout)
+        except (select.error, ValueError, socket.error):
+            # the socket went away under us; the next rtm_read or ping will
+            # notice and reconnect
+            time.sleep(timeout)
+
     def loop(self, test_loop=None):
         """Run the main loop
         server is a limbo Server object
         test_loop, if present, is a number of times to run the loop
+
+        Instead of polling once a second, the loop sleeps on the websocket
+        and wakes up as soon as Slack sends us something, or when the next
+        loop hook or ping is due.
         """
+        if self.dispatcher is None:
+            # no worker threads when driven directly, handle events inline
+            self.dispatcher = Dispatcher(self.server, workers=0)
+
         try:
-            loops_without_activity = 0
+            last_activity = time.time()
+            next_loop_hook = last_activity
             while test_loop is None or test_loop > 0:
-                start = time.time()
-                loops_without_activity += 1
-
                 events = self.server.slack.rtm_read()
+                if events:
+                    last_activity = time.time()
                 for event in events:
-                    loops_without_activity = 0
                     logger.debug("got {0}".format(event.get("type", event)))
-                    response = handle_event(event, self.server)
-                    if response:
-                        if isinstance(event['channel'], dict):
-                            channel_id = event['channel']['id']
-                        else:
-                            channel_id = event['channel']
-                        self.server.slack.rtm_send_message(channel_id, response)
+                    self.dispatcher.dispatch(event)
 
+                now = time.time()
                 # Run the loop hook. This doesn't send messages it receives,
                 # because it doesn't know where to send them. Use
-                # server.slack.post_message to send messages from a loop hook
-                run_hook(self.server.hooks, "loop", self.server)
-
-                # The Slack RTM API docs say:
-                #
-                # > When there is no other activity clients should send a ping
-                # > every few seconds
-                #
-                # So, if we've gone >5 seconds without any activity, send a ping.
-                # If the connection has broken, this will reveal it so slack can
-                # quit
-                if loops_without_activity > 5:
+                # server.outbox.post_message to send messages from a loop hook
+                if now >= next_loop_hook:
+                    run_hook(self.server.hooks, "loop", self.server)
+                    next_loop_hook = now + LOOP_INTERVAL
+
+                # If the connection has broken, the ping will reveal it so
+                # slack can quit
+                if now - last_activity >= PING_INTERVAL:
                     self.server.slack.server.ping()
-                    loops_without_activity = 0
-
-                end = time.time()
-                runtime = start - end
-                time.sleep(max(1 - runtime, 0))
+                    last_activity = now
 
                 if test_loop:
                     test_loop -= 1
+                    if not test_loop:
+                        break
+
+                next_wakeup = min(next_loop_hook, last_activity + PING_INTERVAL)
+                self._wait_for_events(next_wakeup - time.time())
         except KeyboardInterrupt:
             if os.environ.get("LIMBO_DEBUG"):
                 import pdb; pdb.set_trace()
             raise
 
 
+def init_log(config):
+    loglevel = config.get("loglevel", logging.INFO)
+    logformat = config.get("logformat", '%(asctime)s:%(levelname)s:%(name)s:%(message)s')
+    if config.get("logfile"):
+        logging.basicConfig(filename=config.get("logfile"), format=logformat, level=loglevel)
+    else:
+        logging.basicConfig(format=logformat, level=loglevel)
+
+
+def init_graph_pool(registry):
+    """Start the graph workers if the graph plugin is loaded. Done before
+    the bot starts any threads, and so the first graph doesn't wait"""
+    if "graph" not in registry.plugins:
+        return
+    try:
+        from .plugins.common.graphpool import get_pool
+        get_pool()
+    # bare except, a bot that can't draw graphs should still answer
+    # everything else
+    except:
+        logger.warning("Failed to start the graph workers")
+        logger.warning("{0}".format(sys.exc_info()[0]))
+        logger.warning("{0}".format(traceback.format_exc()))
+
+
+def init_plugins(plugindir, plugins_to_load=None):
+    """Return the hooks of the shared plugin registry for plugindir"""
+    return get_registry(plugindir, plugins_to_load).hooks
+
+
 def init_server(args, config, Server=LimboServer, Client=SlackClient):
     """Init_server should be deprecated"""
     # note, key error should be added at main.
@@ -236,14 +252,30 @@ export SLACK_TOKEN=<your-slack-bot-token>
 
 
 def main(args):
-    if args.test:
+    if getattr(args, "mode", None) == "bench":
+        init_log(CONFIG)
+        from . import bench
+        sys.exit(bench.main(args))
+    elif getattr(args, "mode", None) == "replay":
+        init_log(CONFIG)
+        from . import replay
+        return replay.main(args)
+    elif getattr(args, "mode", None) == "fakeapi":
+        init_log(CONFIG)
+        from . import fakeapi
+        return fakeapi.main(args)
+    elif getattr(args, "mode", None) == "imports":
+        init_log(CONFIG)
+        from . import registry
+        return registry.main(args)
+    elif args.test:
         # FakeServer is not working at the moment.
         init_log(CONFIG)
         return repl(FakeServer(), args)
     elif args.command is not None:
         init_log(CONFIG)
         cmd = decode(args.command)
-        print(run_cmd(cmd, FakeServer(), args.hook, args.pluginpath, CONFIG.get("plugins")))
+        print(run_profiled(args, run_cmd, cmd, FakeServer(), args.hook, args.pluginpath, CONFIG.get("plugins")))
         return
 
     def spawn_bot(bot_token=None):
@@ -291,6 +323,17 @@ def run_cmd(cmd, server, hook, pluginpath, plugins_to_load):
     event = {'type': hook, 'text': cmd, "user": "2", 'ts': time.time(), 'team': None, 'channel': 'repl_channel'}
     return encode(handle_event(event, server))
 
+def run_profiled(args, func, *func_args):
+    """Return func(*func_args). With --profile, func is run under the
+    profiler and its report goes to stderr, so stdout is only the reply"""
+    if not getattr(args, "profile", False):
+        return func(*func_args)
+    result, report = profile(func, *func_args,
+                             profile_top=getattr(args, "profile_top", 20),
+                             profile_memory=getattr(args, "profile_memory", False))
+    print(report, file=sys.stderr)
+    return result
+
 # raw_input in 2.6 is input in python 3. Set `input` to the correct function
 try:
     input = raw_input
@@ -305,11 +348,11 @@ def repl(server, args):
             if cmd.lower() == "quit" or cmd.lower() == "exit":
                 return
 
-            print(run_cmd(cmd, server, args.hook, args.pluginpath, None))
+            print(run_profiled(args, run_cmd, cmd, server, args.hook, args.pluginpath, None))
     except (EOFError, KeyboardInterrupt):
         print()
         pass
 
 
 def init_db(database_file):
-    return sqlite3.connect(database_file)
+    return get_database(database_file)
@@ -0,0 +1,195 @@
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+
+from .slackweb import SlackRateLimited
+
+logger = logging.getLogger(__name__)
+
+
+class Message(object):
+    def __init__(self, kind, channel, text=None, kwargs=None, fileobj=None, filename=None):
+        self.kind = kind
+        self.channel = channel
+        self.text = text
+        self.kwargs = kwargs or {}
+        self.fileobj = fileobj
+        self.filename = filename
+        self.attempts = 0
+        # when a rate limited message may be sent again
+        self.retry_at = 0
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def merge(self, other, max_length):
+        """Append the text of other if both are plain text replies of the
+        same kind and options, returns whether it did"""
+        if (self.kind not in ("rtm", "post") or other.kind != self.kind or
+                self.kwargs.get("attachments") or other.kwargs != self.kwargs or
+                not self.text or not other.text or
+                len(self.text) + len(other.text) + 1 > max_length):
+            return False
+        self.text = self.text + "\n" + other.text
+        return True
+
+
+class Outbox(object):
+    """A team's outgoing Slack messages.
+
+    RTM replies and posts are sent by one writer thread, at most one
+    message per channel every interval seconds, which is what Slack allows.
+    Plain text replies waiting for the same channel are joined into one
+    message. When Slack answers 429 the writer pauses for Retry-After
+    seconds and sends the message again, up to max_retries times.
+
+    Uploads are sent on the calling thread instead, retried the same way,
+    so a slow upload doesn't hold up every other channel's messages.
+
+    Until start() is called, messages are sent inline on the calling thread.
+    """
+    def __init__(self, web, slack, interval=1.0, max_retries=3, max_length=4000, timer=time.time):
+        self.web = web
+        self.slack = slack
+        self.interval = interval
+        self.max_retries = max_retries
+        self.max_length = max_length
+        self.timer = timer
+
+        # channel -> messages waiting, channels in the order they started waiting
+        self._channels = OrderedDict()
+        # channel -> earliest time the next message may go out
+        self._next_send = {}
+        self._paused_until = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._send_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+
+    def send(self, channel, text):
+        """Reply over the RTM connection"""
+        self._put(Message("rtm", channel, text))
+
+    def post_message(self, channel, message, **kwargs):
+        """Post through the Web API, returns without waiting for it"""
+        self._put(Message("post", channel, message, kwargs))
+
+    def upload(self, fileobj, filename, channels, **kwargs):
+        """Upload a file right away, outside the writer and its pacing, and
+        return the API response"""
+        message = Message("upload", channels, kwargs=kwargs, fileobj=fileobj, filename=filename)
+        while not self._deliver(message):
+            time.sleep(max(message.retry_at - self.timer(), 0))
+        if message.error is not None:
+            raise message.error
+        return message.result
+
+    def pending(self):
+        with self._cond:
+            return sum(len(messages) for messages in self._channels.values())
+
+    def start(self):
+        self._stopping = False
+        self._thread = threading.Thread(target=self._work, name="limbo-outbox")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Send whatever is still waiting, without pacing, and stop"""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+        self._thread = None
+
+    def _put(self, message):
+        if self._thread is None:
+            with self._send_lock:
+                while not self._deliver(message):
+                    self._paused_until = message.retry_at
+                    time.sleep(max(self._paused_until - self.timer(), 0))
+            return message
+
+        with self._cond:
+            waiting = self._channels.get(message.channel)
+            if waiting and waiting[-1].merge(message, self.max_length):
+                message.done.set()
+                return message
+            if waiting is None:
+                waiting = self._channels[message.channel] = deque()
+            waiting.append(message)
+            self._cond.notify()
+        return message
+
+    def _next(self):
+        """Wait for a message that may be sent now and take it off its
+        queue, returns None once stopped and empty"""
+        with self._cond:
+            while True:
+                if self._stopping and not self._channels:
+                    return None
+                now = self.timer()
+                wake = None
+                if self._stopping or now >= self._paused_until:
+                    for channel, waiting in self._channels.items():
+                        ready = self._next_send.get(channel, 0)
+                        if self._stopping or ready <= now:
+                            message = waiting.popleft()
+                            if not waiting:
+                                del self._channels[channel]
+                            return message
+                        wake = ready if wake is None else min(wake, ready)
+                else:
+                    wake = self._paused_until
+                self._cond.wait(None if wake is None else max(wake - now, 0.01))
+
+    def _work(self):
+        while True:
+            message = self._next()
+            if message is None:
+                return
+            sent = self._deliver(message)
+            with self._cond:
+                if sent:
+                    self._next_send[message.channel] = self.timer() + self.interval
+                else:
+                    self._paused_until = message.retry_at
+                    # first in line again once the pause is over
+                    waiting = self._channels.get(message.channel)
+                    if waiting is None:
+                        waiting = deque()
+                    waiting.appendleft(message)
+                    self._channels[message.channel] = waiting
+
+    def _deliver(self, message):
+        """Send a message. Returns False if it was rate limited and should
+        be sent again later"""
+        message.attempts += 1
+        try:
+            if message.kind == "rtm":
+                message.result = self.slack.rtm_send_message(message.channel, message.text)
+            elif message.kind == "post":
+                message.result = self.web.post_message(message.channel, message.text, **message.kwargs)
+            else:
+                message.result = self.web.upload(message.fileobj, message.filename,
+                                                 message.channel, **message.kwargs)
+        except SlackRateLimited as e:
+            if message.attempts <= self.max_retries:
+                logger.warning("rate limited on {0}, retrying in {1}s".format(message.channel, e.retry_after))
+                message.retry_at = self.timer() + e.retry_after
+                return False
+            logger.warning("rate limited on {0}, giving up on a {1} message".format(message.channel, message.kind))
+            message.error = e
+        # like run_hook, a failing message must not take the writer down
+        except Exception as e:
+            logger.warning("Failed to send a {0} message to {1}".format(message.kind, message.channel))
+            logger.warning("{0}".format(sys.exc_info()[0]))
+            logger.warning("{0}".format(traceback.format_exc()))
+            message.error = e
+        message.done.set()
+        return True
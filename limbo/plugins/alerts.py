@@ -8,22 +8,33 @@ import re
 import time
 import json
 
-from serverdensity.wrapper import Device
-from serverdensity.wrapper import Service
-from serverdensity.wrapper import Alert
-
 from limbo.plugins.common.basewrapper import BaseWrapper
 
+# words after `sdbot` that this plugin answers to
+TRIGGERS = ['alerts']
 COMMANDS = ['list', 'help']
 COLOR = '#3EB891'
+# the extended help of every command, built once
+HELP = {
+    'list': {
+        'title': 'List Open Alerts',
+        'mrkdwn_in': ['text'],
+        'text': ('The full command for alerts is `sdbot alerts list' +
+                 ' <type> <name>`, where `type` is either the word `device`' +
+                 ', `service` or `group`. The argument `name` corresponds to the ' +
+                 'name of that entity. Both `type` and `name` are optional. If ' +
+                 'none is used I will give you 5 alerts by default. ' +
+                 'If you want all alerts write, type `sdbot alerts list all`.'),
+        'color': COLOR
+    }
+}
+HELP_ALL = list(HELP.values())
 
 
 class Wrapper(BaseWrapper):
     def __init__(self, msg, server):
         super(Wrapper, self).__init__(msg, server)
-        self.alert = Alert(self.token)
-        self.device = Device(self.token)
-        self.service = Service(self.token)
+        self.alert = self.clients.api().alerts
 
     def results_of(self, command, typeof, name):
         if typeof == 'help' or command == 'help':
@@ -33,24 +44,10 @@ class Wrapper(BaseWrapper):
         return result
 
     def extra_help(self, command):
-        help_command = {
-            'list': {
-                'title': 'List Open Alerts',
-                'mrkdwn_in': ['text'],
-                'text': ('The full command for alerts is `sdbot alerts list' +
-                         ' <type> <name>`, where `type` is either the word `device`' +
-                         ', `service` or `group`. The argument `name` corresponds to the ' +
-                         'name of that entity. Both `type` and `name` are optional. If ' +
-                         'none is used I will give you 5 alerts by default. ' +
-                         'If you want all alerts write, type `sdbot alerts list all`.'),
-                'color': COLOR
-            }
-        }
-
-        if command == 'list':
-            helptext = [help_command['list']]
-        elif command == 'help':
-            helptext = [attachment for attachment in help_command.values()]
+        if command == 'help':
+            helptext = HELP_ALL
+        else:
+            helptext = [HELP[command]]
         return helptext, ''
 
     def _is_mongoId(self, _id):
@@ -73,11 +70,8 @@ class Wrapper(BaseWrapper):
             text = 'Instead of `{}` you should have used `group`, `service`, `device` or `all`'.format(typeof), ''
             return text
 
-        services = self.service.list()
-        devices = self.device.list()
-
         if name and typeof != 'group':
-            _id = name if not name else self.find_id(name, services, devices)
+            _id = name if not name else self.inventory.find_id(name)
             params['filter']['config.subjectId'] = _id
 
         results = self.alert.triggered(params=params)
@@ -99,7 +93,7 @@ class Wrapper(BaseWrapper):
 
             _id = alert['config']['subjectId']
             if self._is_mongoId(_id):
-                name = self.find_name(_id, services, devices)
+                name = self.inventory.find_name(_id)
                 name = '{}: {}'.format(alert['config']['subjectType'].title(), name)
             else:
                 name = 'Group: {}'.format(_id)
@@ -159,7 +153,7 @@ def on_message(msg, server):
             'text': message
         }
 
-        server.slack.post_message(
+        server.outbox.post_message(
             msg['channel'],
             '',
             as_user=server.slack.server.username,
@@ -1,9 +1,23 @@
 import os
 import time
 import re
+from datetime import datetime
+from datetime import timedelta
 
 from pytz import timezone
 
+from limbo.plugins.common.catalog import MetricTrie
+from limbo.plugins.common.clients import ClientRegistry
+from limbo.plugins.common.inventory import Inventory
+from limbo.plugins.common.series import (MemorySeriesStore,
+                                         SqliteSeriesStore,
+                                         from_timestamp,
+                                         gap_window,
+                                         oldest_kept,
+                                         series_key,
+                                         to_timestamp)
+from limbo.utils.cache import TTLCache
+
 
 class BaseWrapper(object):
     def __init__(self, msg, server):
@@ -17,6 +31,103 @@ class BaseWrapper(object):
         else:
             raise Exception('SD_AUTH_TOKEN is missing from environment')
         self.timezone = timezone(os.environ.get('TIMEZONE', 'Europe/London'))
+        self.clients = self.server.context.get('sd_clients', self._init_clients)
+        self.inventory = self.server.context.get('inventory', self._init_inventory)
+
+    def _init_clients(self):
+        return ClientRegistry(self.token,
+                              pool_size=int(self.server.config.get('sd_pool_size', 10)),
+                              base_url=self.server.config.get('sd_api_url'))
+
+    def _init_inventory(self):
+        config = self.server.config
+        return Inventory(self.clients,
+                         ttl=int(config.get('inventory_ttl', 60)),
+                         max_age=int(config.get('inventory_max_age', 600)))
+
+    def metric_catalog(self, _id, fetch=True):
+        """Return the MetricTrie of the metrics a device reported in the last
+        2 hours. If it isn't cached and fetch is False, return None"""
+        config = self.server.config
+        cache = self.server.context.get('metric_catalog', lambda: TTLCache(
+            maxsize=256,
+            ttl=int(config.get('metric_catalog_ttl', 600))
+        ))
+        catalog = cache.get(_id)
+        if catalog is None and fetch:
+            now = datetime.now()
+            past = now - timedelta(minutes=120)
+            catalog = MetricTrie(self.clients.api().metrics.available(_id, past, now))
+            cache.set(_id, catalog)
+        return catalog
+
+    @staticmethod
+    def no_metrics(name):
+        """The reply for a device that has no metrics to list"""
+        return ('No metrics available for `{}`, it hasn\'t reported any in the last 2 hours. '.format(name) +
+                'It might be offline.')
+
+    def series_store(self):
+        """The team's downloaded metric series, in the bot's database if it
+        has one and in memory otherwise"""
+        def init_store():
+            if self.server.db is not None:
+                return SqliteSeriesStore(self.server)
+            return MemorySeriesStore()
+        return self.server.context.get('series_store', init_store)
+
+    def fetch_series(self, _id, metrics, start, end):
+        """Return the node and names get_data would give for the dotted
+        metric path between start and end, only asking Server Density for
+        the parts of the window that aren't stored yet"""
+        metrics = metrics.strip()
+        _, filter = self.metric_filter(metrics.split('.'))
+        start_ts, end_ts = to_timestamp(start), to_timestamp(end)
+
+        store = self.series_store()
+        key = series_key(_id, metrics, start_ts, end_ts)
+        oldest = oldest_kept(start_ts, end_ts)
+        for gap in store.missing(key, start_ts, end_ts):
+            # fetched at the resolution of the whole window, not the gap's
+            gap_start, gap_end = gap_window(gap[0], gap[1], start_ts, end_ts)
+            found = self.get_data(self.metrics.get(
+                _id, from_timestamp(gap_start, start), from_timestamp(gap_end, end), filter))
+            if not found:
+                continue
+            node, names = found
+            meta = {
+                'node': dict((k, v) for k, v in node.items() if k not in ('data', 'tree')),
+                'names': names
+            }
+            store.add(key, gap_start, gap_end, meta, node.get('data') or [], oldest)
+
+        meta, points = store.read(key, start_ts, end_ts)
+        if not meta:
+            return {'data': []}, []
+        node = dict(meta['node'])
+        node['data'] = points
+        return node, meta['names']
+
+    def unknown_metric(self, _id, metrics, name, fetch=False):
+        """If the dotted metric path isn't one of the device's, return a
+        message saying so with some suggestions, otherwise None. Without
+        fetch, only a catalog that is already cached is checked."""
+        if not metrics.strip():
+            return ('Which metrics would you like for `{}`? '.format(name) +
+                    'You can see what metrics are available by using `sdbot devices available {}`'.format(name))
+        catalog = self.metric_catalog(_id, fetch)
+        parts = [part.strip() for part in metrics.strip().split('.')]
+        # an empty catalog means the device is offline, not that it's wrong
+        if not catalog or catalog.contains(parts):
+            return None
+
+        text = '`{}` is not one of the metrics of `{}`.'.format(metrics, name)
+        suggestions = catalog.complete(parts)
+        if suggestions:
+            text += ' Did you mean {}?'.format(', '.join('`{}`'.format('.'.join(s)) for s in suggestions))
+        else:
+            text += ' You can see what metrics are available by using `sdbot devices available {}`'.format(name)
+        return text
 
     @classmethod
     def clean_parsing(cls, string):
@@ -28,23 +139,6 @@ class BaseWrapper(object):
             string = string.replace(string[match.start():match.end()], clean_string)
         return string
 
-    def find_name(self, _id, services, devices):
-        for s in services:
-            if _id == s['_id']:
-                return s['name']
-        for d in devices:
-            if _id == d['_id']:
-                return d['name']
-        return 'No name'
-
-    def find_id(self, name, services, devices):
-        for s in services:
-            if name == s['name']:
-                return s['_id']
-        for d in devices:
-            if name == d['name']:
-                return d['_id']
-
     def get_data(self, data, names=None):
         """Inputs the data from the metrics endpoints and returns
         the node that has contains the data + names of the metrics."""
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+
+
+class MetricTrie(object):
+    """The metric paths of a device as a prefix tree, one level per part of
+    the path, so cpuStats.CPUs.usr is cpuStats -> CPUs -> usr.
+
+    Built from the tree that Metrics.available returns.
+    """
+    def __init__(self, definitions=None):
+        self.root = OrderedDict()
+        self._add(self.root, definitions or [])
+
+    def _add(self, node, definitions):
+        for definition in definitions:
+            child = node.setdefault(definition['key'], OrderedDict())
+            self._add(child, definition.get('tree', []))
+
+    def __len__(self):
+        return len(self.root)
+
+    def _node(self, parts):
+        node = self.root
+        for part in parts:
+            node = node.get(part)
+            if node is None:
+                return None
+        return node
+
+    def contains(self, parts):
+        """Whether parts is a metric, or a group of metrics, of the device"""
+        return self._node(parts) is not None
+
+    def paths(self, node=None, prefix=None):
+        """Yield every full metric path, as a list of parts, in the order
+        the API listed them"""
+        node = self.root if node is None else node
+        prefix = prefix or []
+        for key, child in node.items():
+            if child:
+                for path in self.paths(child, prefix + [key]):
+                    yield path
+            else:
+                yield prefix + [key]
+
+    def complete(self, parts, limit=5):
+        """Suggest up to limit metric paths for parts, which isn't a metric
+        of the device: the ones under the longest prefix of parts that is,
+        narrowed to those whose next part starts like the first wrong one"""
+        node = self.root
+        known = []
+        for part in parts:
+            if part not in node:
+                break
+            node = node[part]
+            known.append(part)
+
+        wrong = parts[len(known)] if len(known) < len(parts) else ''
+        suggestions = []
+        for key, child in node.items():
+            if not key.lower().startswith(wrong.lower()):
+                continue
+            if child:
+                for path in self.paths(child, known + [key]):
+                    suggestions.append(path)
+                    if len(suggestions) >= limit:
+                        return suggestions
+            else:
+                suggestions.append(known + [key])
+            if len(suggestions) >= limit:
+                return suggestions
+        return suggestions
@@ -0,0 +1,73 @@
+import threading
+import time
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from serverdensity.wrapper import ApiClient
+
+from limbo.stats import STATS
+
+
+class PooledSession(requests.Session):
+    """A requests Session that keeps one pool of keep-alive connections.
+
+    ApiClient mounts a new HTTPAdapter before every request, which would
+    throw the pooled connections away each time, so mounting over a prefix
+    that is already set up is ignored.
+    """
+    def __init__(self, pool_size=10, max_retries=3):
+        super(PooledSession, self).__init__()
+        for prefix in ('https://', 'http://'):
+            adapter = HTTPAdapter(pool_connections=pool_size,
+                                  pool_maxsize=pool_size,
+                                  max_retries=max_retries)
+            requests.Session.mount(self, prefix, adapter)
+
+    def mount(self, prefix, adapter):
+        if prefix not in self.adapters:
+            super(PooledSession, self).mount(prefix, adapter)
+
+    def send(self, request, **kwargs):
+        """Time every call in STATS, by the first two parts of its path
+        such as inventory/devices. ApiClient sends prepared requests
+        itself, so this is the one place every call goes through"""
+        endpoint = '/'.join(urlparse(request.url).path.strip('/').split('/')[:2])
+        start = time.time()
+        ok = False
+        try:
+            response = super(PooledSession, self).send(request, **kwargs)
+            ok = response.status_code < 400
+            return response
+        finally:
+            STATS.record('limbo_serverdensity_seconds', (('endpoint', endpoint),),
+                         time.time() - start, ok)
+
+
+class ClientRegistry(object):
+    """A team's Server Density API clients.
+
+    Every thread shares the same pooled session, but gets an ApiClient of
+    its own: ApiClient keeps the query parameters of the request in flight
+    on itself, so it can't be shared between threads.
+    """
+    def __init__(self, token, pool_size=10, base_url=None):
+        self.token = token
+        # somewhere else than api.serverdensity.io, such as limbo.fakeapi
+        self.base_url = base_url
+        self.session = PooledSession(pool_size=pool_size)
+        self._local = threading.local()
+
+    def api(self):
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            api = ApiClient(self.token)
+            api._session = self.session
+            if self.base_url:
+                api.BASE_URL = self.base_url.rstrip('/')
+            self._local.api = api
+        return api
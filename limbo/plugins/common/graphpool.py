@@ -0,0 +1,202 @@
+"""Renders graphs in a pool of worker processes.
+
+pyplot keeps global state and rendering is CPU bound, so drawing a graph
+on the bot's own threads would serialize every team behind the GIL. The
+workers set up matplotlib once (Agg backend, font cache loaded) and hand
+back finished PNGs as bytes.
+
+The pool is started with the bot, before its other threads, and its
+workers are started by a fork server (or spawned) rather than forked from
+the bot, because a process forked while threads run can inherit a lock one
+of them held, such as the logging lock, and hang on it.
+"""
+import io
+import logging
+import multiprocessing
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from limbo.settings import CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 800 and 355 pixels.
+WIDTH = 8
+HEIGHT = 3.55
+DPI = 100
+TICKS = 5
+BGCOLOR = '#f3f6f6'
+FONT = {
+    'size': 16,
+    'family': 'Arial'
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    try:
+        import matplotlib
+    except ImportError:
+        # a worker that exits is replaced straight away, so stay up and let
+        # render fail instead
+        logger.warning('matplotlib is not installed, graphs will fail')
+        return
+    matplotlib.use('Agg')
+    from matplotlib import font_manager
+    from matplotlib import pyplot as plt
+
+    plt.rc('font', **FONT)
+    # finding the font builds matplotlib's font cache, which is the slow
+    # part of the first render
+    font_manager.findfont(FONT['family'])
+
+
+def _context():
+    """Where the workers come from: a fork server, or spawn where there's
+    none. Python 2 can only fork"""
+    if not hasattr(multiprocessing, 'get_context'):
+        return multiprocessing
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def get_pool():
+    """The graph workers, started on the first call. Slackbot calls this when
+    it starts, so no graph waits for the workers to set up"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            processes = int(CONFIG.get('graph_workers') or multiprocessing.cpu_count())
+            logger.debug('starting {0} graph workers'.format(processes))
+            _pool = _context().Pool(processes=processes, initializer=_init_worker)
+        return _pool
+
+
+def downsample(x, y, buckets):
+    """Cut a series down to at most 2 * buckets + 2 points.
+
+    The series is split into buckets of equal size and only the lowest and
+    the highest point of each bucket is kept, so spikes and dips survive
+    while a month of data shrinks to roughly one point per pixel.
+    """
+    n = len(x)
+    if n <= 2 * buckets + 2:
+        return x, y
+
+    size = -(-n // buckets)
+    # pad with the last value so the series reshapes into full buckets
+    padded = np.empty(size * buckets, dtype=y.dtype)
+    padded[:n] = y
+    padded[n:] = y[-1]
+    rows = padded.reshape(buckets, size)
+
+    offsets = np.arange(buckets) * size
+    keep = np.concatenate((
+        [0, n - 1],
+        offsets + rows.argmin(axis=1),
+        offsets + rows.argmax(axis=1)
+    ))
+    keep = np.unique(np.minimum(keep, n - 1))
+    return x[keep], y[keep]
+
+
+def render_graph(x, y, unit, diff_sec):
+    """Render a graph of the values y at the unix timestamps x in a worker
+    process and return it as PNG bytes"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # two points per pixel column is all the graph can show
+    x, y = downsample(x, y, int(WIDTH * DPI) // 2)
+
+    timeout = float(CONFIG.get('graph_timeout', 60))
+    return get_pool().apply_async(render, (x, y, unit, diff_sec)).get(timeout)
+
+
+def to_datetimes(x):
+    """Convert unix timestamps to local naive datetimes in one go. The UTC
+    offset is looked up once per quarter hour the series covers, since
+    that's as often as it can change, so a series across a DST change gets
+    the right offset on either side of it"""
+    if not len(x):
+        return x
+    quarters, index = np.unique(np.floor(x / 900) * 900, return_inverse=True)
+    offsets = np.array([(datetime.fromtimestamp(q) - datetime.utcfromtimestamp(q)).total_seconds()
+                        for q in quarters])
+    millis = np.round((x + offsets[index.ravel()]) * 1000).astype('int64')
+    return millis.astype('datetime64[ms]').astype(datetime)
+
+
+def render(x, y, unit, diff_sec):
+    """Draw the graph. Runs inside a worker process"""
+    from matplotlib.dates import AutoDateLocator
+    from matplotlib.dates import DateFormatter
+    from matplotlib import pyplot as plt
+
+    if diff_sec < 86400:
+        x_no_ticks = 10
+        fmt = '%H:%M'
+    elif (3600*24) < diff_sec and diff_sec < (3600*24*4):
+        x_no_ticks = 5
+        fmt = '%d %b, %H:%M'
+    else:
+        x_no_ticks = 6
+        fmt = '%d %b %Y'
+
+    # size of figure and setting background color
+    fig = plt.figure()
+    fig.set_size_inches(WIDTH, HEIGHT)
+    fig.set_facecolor(BGCOLOR)
+
+    # axis color, no ticks and bottom line in grey color.
+    ax = plt.axes(axisbg=BGCOLOR, frameon=True)
+    ax.xaxis.set_ticks_position('none')
+    ax.spines['bottom'].set_color('#aabcc2')
+    ax.yaxis.set_ticks_position('none')
+
+    # removing all but bottom spines
+    for key, sp in ax.spines.items():
+        if key != 'bottom':
+            sp.set_visible(False)
+
+    # setting amounts of ticks on y axis
+    yloc = plt.MaxNLocator(TICKS)
+    ax.yaxis.set_major_locator(yloc)
+
+    # Deciding how many ticks we want on the graph
+    locator = AutoDateLocator(minticks=(x_no_ticks - 2), maxticks=x_no_ticks)
+    formatter = DateFormatter(fmt)
+
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(formatter)
+
+    # turns off small ticks
+    plt.tick_params(axis='x',
+                    which='both',
+                    bottom='on',
+                    top='off',
+                    pad=10)
+    # Can't seem to set label color differently, changing tick_params color changes labels.
+    ax.xaxis.label.set_color('#FFFFFF')
+
+    # setting dates in x-axis automatically triggers use of AutoDateLocator
+    plt.plot(to_datetimes(x), y, color='#53b4d4', linewidth=2)
+
+    # pick values for y-axis
+    y_ticks = np.linspace(np.nanmin(y), np.nanmax(y), TICKS)
+    y_ticks = np.round(y_ticks, decimals=2)
+    plt.yticks(y_ticks, [str(val) + unit for val in y_ticks])
+    # plt.ylim(ymin=0.1)  # Only show values of a certain threshold.
+
+    plt.tight_layout()
+    buf = io.BytesIO()
+    plt.savefig(buf,
+                format='png',
+                facecolor=fig.get_facecolor(),
+                dpi=DPI)
+    plt.close(fig)
+    return buf.getvalue()
@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class InventoryIndex(object):
+    """Dict lookups over one downloaded list of devices or services, in both
+    directions. Built once per download so lookups never scan the list"""
+    def __init__(self, items):
+        self.ids = {}
+        self.names = {}
+        for item in items:
+            # the first one wins, like the linear scans used to
+            self.ids.setdefault(item['name'], item['_id'])
+            self.names.setdefault(item['_id'], item['name'])
+
+
+class Inventory(object):
+    """A team's devices and services, downloaded from Server Density at most
+    once every ttl seconds and shared by every plugin.
+
+    Once a list is older than ttl it is still served, and a background thread
+    downloads a fresh copy. Only a list older than max_age, or one that
+    hasn't been downloaded yet, makes the caller wait for the network.
+    """
+    KINDS = ('services', 'devices')
+
+    def __init__(self, clients, ttl=60, max_age=600, timer=time.time):
+        self.clients = clients
+        self.ttl = ttl
+        self.max_age = max_age
+        self.timer = timer
+        # kind -> (time fetched, list, index)
+        self._lists = {}
+        self._refreshing = set()
+        self._locks = dict((kind, threading.Lock()) for kind in self.KINDS)
+        self._lock = threading.Lock()
+
+    def devices(self):
+        return self._get('devices')[0]
+
+    def services(self):
+        return self._get('services')[0]
+
+    def find_id(self, name, kinds=KINDS):
+        """Return the id of the first of kinds called name, or None"""
+        for kind in kinds:
+            _id = self._get(kind)[1].ids.get(name)
+            if _id:
+                return _id
+
+    def find_name(self, _id, kinds=KINDS):
+        for kind in kinds:
+            name = self._get(kind)[1].names.get(_id)
+            if name:
+                return name
+        return 'No name'
+
+    def _fetch(self, kind):
+        # ApiClient.devices and ApiClient.services
+        return getattr(self.clients.api(), kind).list()
+
+    def _get(self, kind):
+        """Return the list of kind and its index"""
+        entry = self._lists.get(kind)
+        if entry is None:
+            return self.refresh(kind)
+
+        fetched_at, items, index = entry
+        age = self.timer() - fetched_at
+        if age >= self.max_age:
+            return self.refresh(kind)
+        if age >= self.ttl:
+            self._refresh_in_background(kind)
+        return items, index
+
+    def refresh(self, kind):
+        """Download a list now and return it with its index. Callers that
+        arrive while a download is running wait for it instead of starting
+        their own"""
+        started = self.timer()
+        with self._locks[kind]:
+            entry = self._lists.get(kind)
+            if entry is None or entry[0] < started:
+                items = self._fetch(kind)
+                entry = (self.timer(), items, InventoryIndex(items))
+                self._lists[kind] = entry
+            return entry[1], entry[2]
+
+    def _refresh_in_background(self, kind):
+        with self._lock:
+            if kind in self._refreshing:
+                return
+            self._refreshing.add(kind)
+
+        def run():
+            try:
+                self.refresh(kind)
+            # keep serving the stale list if the download fails
+            except Exception:
+                logger.warning("Failed to refresh {0}".format(kind), exc_info=True)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(kind)
+
+        thread = threading.Thread(target=run, name="inventory-{0}".format(kind))
+        thread.daemon = True
+        thread.start()
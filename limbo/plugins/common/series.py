@@ -0,0 +1,184 @@
+"""Metric series that have already been downloaded, so asking for an
+overlapping window again only fetches the part that isn't stored yet.
+
+Points are stored per device, metric path and resolution, together with
+the time ranges that have been fetched. The newest few minutes of every
+fetch are not counted as covered, because Server Density may still fill
+them in, so they are always asked for again. Points older than twice the
+longest window of their resolution are dropped whenever a series grows.
+"""
+import calendar
+import json
+import math
+import threading
+import time
+from datetime import datetime
+
+from limbo.utils.cache import TTLCache
+
+
+def to_timestamp(dt):
+    if dt.tzinfo is not None:
+        return calendar.timegm(dt.utctimetuple())
+    return time.mktime(dt.timetuple())
+
+
+def from_timestamp(ts, like):
+    """The datetime of ts, with the same timezone as the datetime like"""
+    return datetime.fromtimestamp(ts, like.tzinfo)
+
+
+def resolution(start, end):
+    """Which resolution Server Density answers a window with, 0 for windows
+    of up to an hour and one more for every doubling after that"""
+    return int(math.ceil(math.log(max(end - start, 3600) / 3600.0, 2)))
+
+
+def series_key(_id, path, start, end):
+    """The series a window belongs to. Server Density returns coarser points
+    for longer windows, so windows of very different lengths are kept apart"""
+    return '{0}:{1}:{2}'.format(_id, path, resolution(start, end))
+
+
+def gap_window(gap_start, gap_end, start, end):
+    """The window to fetch a gap of the window [start, end] with. A short
+    gap would come back with finer points than the rest of the series, so
+    it's widened back to the start until it's at the window's resolution"""
+    level = resolution(start, end)
+    shortest = 3600 * 2 ** (level - 1) + 1 if level else 0
+    return min(gap_start, gap_end - shortest), gap_end
+
+
+def oldest_kept(start, end, now=None):
+    """Points of the series of window [start, end] older than this are
+    dropped, never any of the window itself"""
+    now = now or time.time()
+    return min(start, now - 2 * 3600 * 2 ** resolution(start, end))
+
+
+def missing_ranges(covered, start, end):
+    """The parts of [start, end] not in covered, a sorted list of
+    non-overlapping (start, end) ranges"""
+    gaps = []
+    for covered_start, covered_end in covered:
+        if covered_end <= start:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > start:
+            gaps.append((start, covered_start))
+        start = max(start, covered_end)
+    if start < end:
+        gaps.append((start, end))
+    return gaps
+
+
+def merge_range(covered, start, end):
+    """Add [start, end] to covered and return the merged ranges"""
+    merged = []
+    for covered_start, covered_end in sorted(covered + [(start, end)]):
+        if merged and covered_start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], covered_end))
+        else:
+            merged.append((covered_start, covered_end))
+    return merged
+
+
+class MemorySeriesStore(object):
+    def __init__(self, settle=300, maxsize=256, ttl=3600):
+        self.settle = settle
+        self._series = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def missing(self, key, start, end):
+        series = self._series.get(key)
+        if series is None:
+            return [(start, end)]
+        return missing_ranges(series['ranges'], start, end)
+
+    def add(self, key, start, end, meta, points, oldest=None):
+        """Store points fetched for [start, end], dropping every point of
+        the series from before oldest"""
+        covered_end = min(end, time.time() - self.settle)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {'ranges': [], 'points': {}, 'meta': meta}
+            if meta:
+                series['meta'] = meta
+            for point in points:
+                series['points'][point['x']] = point['y']
+            if covered_end > start:
+                series['ranges'] = merge_range(series['ranges'], start, covered_end)
+            if oldest is not None:
+                series['points'] = dict((x, y) for x, y in series['points'].items() if x >= oldest)
+                series['ranges'] = [(max(s, oldest), e) for s, e in series['ranges'] if e > oldest]
+            self._series.set(key, series)
+
+    def read(self, key, start, end):
+        series = self._series.get(key)
+        if series is None:
+            return None, []
+        with self._lock:
+            points = [{'x': x, 'y': y} for x, y in series['points'].items() if start <= x <= end]
+        points.sort(key=lambda point: point['x'])
+        return series['meta'], points
+
+
+class SqliteSeriesStore(object):
+    """Keeps the series in the bot's database through server.query, so they
+    survive a restart"""
+    def __init__(self, server, settle=300):
+        self.server = server
+        self.settle = settle
+        server.query("CREATE TABLE IF NOT EXISTS series_meta "
+                     "(key TEXT PRIMARY KEY, meta TEXT)")
+        server.query("CREATE TABLE IF NOT EXISTS series_ranges "
+                     "(key TEXT, start REAL, end REAL)")
+        server.query("CREATE TABLE IF NOT EXISTS series_points "
+                     "(key TEXT, x REAL, y REAL, PRIMARY KEY (key, x))")
+
+    def _ranges(self, key):
+        return [(s, e) for s, e in self.server.query(
+            "SELECT start, end FROM series_ranges WHERE key = ? ORDER BY start", key)]
+
+    def missing(self, key, start, end):
+        return missing_ranges(self._ranges(key), start, end)
+
+    def add(self, key, start, end, meta, points, oldest=None):
+        """Store points fetched for [start, end], dropping every point of
+        the series from before oldest"""
+        covered_end = min(end, time.time() - self.settle)
+        # writes are only queued here, the reads in read() wait for them
+        if meta:
+            self.server.execute("INSERT OR REPLACE INTO series_meta VALUES (?, ?)", key, json.dumps(meta))
+        self.server.executemany("INSERT OR REPLACE INTO series_points VALUES (?, ?, ?)",
+                                ((key, point['x'], point['y']) for point in points))
+        statements = []
+        if covered_end > start:
+            # the ranges this one overlaps are merged into a new row and
+            # deleted in the same write, so two workers can't lose each
+            # other's ranges
+            overlapping = "key = ? AND end >= ? AND start <= ?"
+            statements.append((
+                "INSERT INTO series_ranges SELECT ?, min(?, coalesce(min(start), ?)), "
+                "max(?, coalesce(max(end), ?)) FROM series_ranges WHERE " + overlapping,
+                (key, start, start, covered_end, covered_end, key, start, covered_end)))
+            statements.append((
+                "DELETE FROM series_ranges WHERE " + overlapping + " AND rowid != last_insert_rowid()",
+                (key, start, covered_end)))
+        if oldest is not None:
+            statements.append(("DELETE FROM series_points WHERE key = ? AND x < ?", (key, oldest)))
+            statements.append(("DELETE FROM series_ranges WHERE key = ? AND end <= ?", (key, oldest)))
+            statements.append(("UPDATE series_ranges SET start = ? WHERE key = ? AND start < ?",
+                               (oldest, key, oldest)))
+        if statements:
+            self.server.executeall(statements)
+
+    def read(self, key, start, end):
+        rows = self.server.query("SELECT meta FROM series_meta WHERE key = ?", key)
+        meta = json.loads(rows[0][0]) if rows else None
+        points = [{'x': x, 'y': y} for x, y in self.server.iterquery(
+            "SELECT x, y FROM series_points WHERE key = ? AND x BETWEEN ? AND ? ORDER BY x",
+            key, start, end)]
+        return meta, points
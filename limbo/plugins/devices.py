@@ -8,20 +8,56 @@ import re
 import json
 from datetime import datetime
 from datetime import timedelta
-from serverdensity.wrapper import Device
-from serverdensity.wrapper import Metrics
 
 from limbo.plugins.common.basewrapper import BaseWrapper
 
+# words after `sdbot` that this plugin answers to
+TRIGGERS = ['device', 'devices']
 COMMANDS = ['find', 'value', 'available', 'list', 'help']
 COLOR = '#E83880'
+# the extended help of every command, built once
+HELP = {
+    'value': {
+        'title': 'Latest Value for a Device',
+        'mrkdwn_in': ['text'],
+        'text': ('To get the latest value for a device, type ' +
+                 '`sdbot devices metric.here for deviceName`. ' +
+                 'The metrics need to be separated by dots.'),
+        'color': COLOR
+    },
+    'find': {
+        'title': 'Find a Device',
+        'mrkdwn_in': ['text'],
+        'text': ('To find a device type ' +
+                 '`sdbot devices find deviceName`. I can also accept regex for the argument `deviceName`. ' +
+                 'For example `sdbot devices find 2$`.'),
+        'color': COLOR
+    },
+    'list': {
+        'title': 'List Devices',
+        'mrkdwn_in': ['text'],
+        'text': ('To get a list of your devices type, ' +
+                 '`sdbot devices list <no>`. In this case `<no>` ' +
+                 'a number. If you leave it out I will ' +
+                 'list the first 5 devices.'),
+        'color': COLOR
+    },
+    'available': {
+        'title': 'Available Metrics',
+        'mrkdwn_in': ['text'],
+        'text': ('To get all the available metrics for a device, type ' +
+                 '`sdbot devices available deviceName`. This will ' +
+                 'display a list of metrics you can use for the command `devices value` or `graph`'),
+        'color': COLOR
+    }
+}
+HELP_ALL = list(HELP.values())
 
 
 class Wrapper(BaseWrapper):
     def __init__(self, msg, server):
         super(Wrapper, self).__init__(msg, server)
-        self.device = Device(self.token)
-        self.metrics = Metrics(self.token)
+        self.metrics = self.clients.api().metrics
 
     def results_of(self, command, metrics, name):
         if command == 'help' or name == 'help':
@@ -37,52 +73,10 @@ class Wrapper(BaseWrapper):
         return result
 
     def extra_help(self, command):
-        help_command = {
-            'value': {
-                'title': 'Latest Value for a Device',
-                'mrkdwn_in': ['text'],
-                'text': ('To get the latest value for a device, type ' +
-                         '`sdbot devices metric.here for deviceName`. ' +
-                         'The metrics need to be separated by dots.'),
-                'color': COLOR
-            },
-            'find': {
-                'title': 'Find a Device',
-                'mrkdwn_in': ['text'],
-                'text': ('To find a device type ' +
-                         '`sdbot devices find deviceName`. I can also accept regex for the argument `deviceName`. ' +
-                         'For example `sdbot devices find 2$`.'),
-                'color': COLOR
-            },
-            'list': {
-                'title': 'List Devices',
-                'mrkdwn_in': ['text'],
-                'text': ('To get a list of your devices type, ' +
-                         '`sdbot devices list <no>`. In this case `<no>` ' +
-                         'a number. If you leave it out I will ' +
-                         'list the first 5 devices.'),
-                'color': COLOR
-            },
-            'available': {
-                'title': 'Available Metrics',
-                'mrkdwn_in': ['text'],
-                'text': ('To get all the available metrics for a device, type ' +
-                         '`sdbot devices available deviceName`. This will ' +
-                         'display a list of metrics you can use for the command `devices value` or `graph`'),
-                'color': COLOR
-            }
-        }
-
-        if command == 'value':
-            helptext = [help_command['value']]
-        elif command == 'available':
-            helptext = [help_command['available']]
-        elif command == 'find':
-            helptext = [help_command['find']]
-        elif command == 'list':
-            helptext = [help_command['list']]
-        elif command == 'help':
-            helptext = [attachment for attachment in help_command.values()]
+        if command == 'help':
+            helptext = HELP_ALL
+        else:
+            helptext = [HELP[command]]
         return helptext
 
     def _format_devices(self, devices):
@@ -122,7 +116,7 @@ class Wrapper(BaseWrapper):
             except ValueError:
                 text = '{} is not a number, now is it. You see, it needs to be.'.format(number)
                 return text
-        devices = self.device.list()
+        devices = self.inventory.devices()
         if number:
             devices_trunc = devices[:number]
         else:
@@ -131,7 +125,7 @@ class Wrapper(BaseWrapper):
         return self._format_devices(devices_trunc)
 
     def find_device(self, name):
-        devices = self.device.list()
+        devices = self.inventory.devices()
 
         if not name:
             msg = 'Here are all the devices that I found'
@@ -151,25 +145,23 @@ class Wrapper(BaseWrapper):
         return formatted_devices
 
     def get_value(self, name, metrics):
-        devices = self.device.list()
-        _id = self.find_id(name, [], devices)
+        _id = self.inventory.find_id(name, ['devices'])
         if not _id:
             return 'I couldn\'t find your device'
 
         if not metrics:
             return ('You have not included any metrics the right way to do it ' +
                     'is give metrics this way `sdbot devices value memory.memSwapFree for {}`'.format(name))
-        metrics = metrics.split('.')
-        _, filter = self.metric_filter(metrics)
-
+        unknown = self.unknown_metric(_id, metrics, name)
+        if unknown:
+            return unknown
         now = datetime.now()
         past30 = now - timedelta(minutes=35)
 
-        metrics = self.metrics.get(_id, past30, now, filter)
-        device, names = self.get_data(metrics)
+        device, names = self.fetch_series(_id, metrics, past30, now)
 
         if not device.get('data'):
-            return 'Could not find any data for these metrics'
+            return self.unknown_metric(_id, metrics, name, fetch=True) or 'Could not find any data for these metrics'
 
         result = {
             'title': 'Device name: {}'.format(name),
@@ -185,34 +177,16 @@ class Wrapper(BaseWrapper):
         }
         return [result]
 
-    def flatten(self, lst):
-        for dct in lst:
-            key = dct["key"]
-            if "tree" not in dct:
-                yield [key]  # base case
-            else:
-                for result in self.flatten(dct["tree"]):  # recursive case
-                    yield [key] + result
-
     def get_available(self, name):
-        devices = self.device.list()
-        _id = self.find_id(name, [], devices)
+        _id = self.inventory.find_id(name, ['devices'])
 
         if not _id:
             return 'It looks like there is no device named `{}`'.format(name)
-        now = datetime.now()
-        past30 = now - timedelta(minutes=120)
-
-        metrics = self.metrics.available(_id, past30, now)
-        available = list(self.flatten(metrics))
-        text = ''
-        for a in available:
-            text += '.'.join(a) + '\n'
-        if text:
-            text = 'Here are the metrics you can use\n' + '```' + text + '```'
-        else:
-            text = 'Your device seems to be offline, it doesn\'t contain any metrics in the last 2 hours'
-        return text
+        available = ['.'.join(path) for path in self.metric_catalog(_id).paths()]
+        available = [path for path in available if path]
+        if not available:
+            return self.no_metrics(name)
+        return 'Here are the metrics you can use\n' + '```' + '\n'.join(available) + '\n```'
 
 def on_message(msg, server):
     text = msg.get("text", "")
@@ -245,7 +219,7 @@ def on_message(msg, server):
             'text': 'This is what I got for you'
         }
 
-        server.slack.post_message(
+        server.outbox.post_message(
             msg['channel'],
             '',
             as_user=server.slack.server.username,
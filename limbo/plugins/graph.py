@@ -5,141 +5,78 @@
     "color": "#E8A824"
 }"""
 
-import os
 import json
 import re
 import io
-import time
-import importlib
+import calendar
 from datetime import timedelta
 from datetime import datetime
 
-from serverdensity.wrapper import Metrics
-from serverdensity.wrapper import Device
-
-from matplotlib.dates import AutoDateLocator
-from matplotlib.dates import DateFormatter
-from matplotlib import pyplot as plt
 import numpy as np
-
-from slacker import Slacker
 import parsedatetime
 
 from limbo.plugins.common.basewrapper import BaseWrapper
+from limbo.plugins.common.graphpool import render_graph
+from limbo.utils.cache import TTLCache
 
 COLOR = "#E8A824"
+# words after `sdbot` that this plugin answers to
+TRIGGERS = ['graph']
 COMMANDS = ['graph', 'help']
 
 
 class Wrapper(BaseWrapper):
     def __init__(self, msg, server):
         super(Wrapper, self).__init__(msg, server)
-        self.metrics = Metrics(self.token)
-        self.device = Device(self.token)
+        self.metrics = self.clients.api().metrics
 
     def results_of(self, metrics, name, period):
         if name == 'help':
-            mod = importlib.import_module('limbo.plugins.graph')
-            result = [json.loads(mod.__doc__)]
+            # the registry parsed the docstring when it was built
+            attachment = self.server.hooks.get('help', {}).get('graph')
+            result = [attachment or json.loads(__doc__)]
         else:
             result = self.get_metrics(metrics, name, period)
         return result
 
     def create_graph(self, device, difference):
+        data = device['data']
+        x = np.fromiter((point['x'] for point in data), dtype=float, count=len(data))
+        y = np.fromiter((point['y'] for point in data), dtype=float, count=len(data))
+        return render_graph(x, y, self.extract_unit(device), int(difference.total_seconds()))
+
+    def graph_cache(self):
+        """Rendered graphs of this team, by device, metric and time bucket"""
+        config = self.server.config
+        return self.server.context.get('graph_cache', lambda: TTLCache(
+            maxsize=int(config.get('graph_cache_size', 64)),
+            ttl=int(config.get('graph_cache_ttl', 60))
+        ))
+
+    def graph_key(self, _id, filter, past, now):
+        """Round both ends of the period down to the cache ttl, so asking for
+        the same graph again within that time hits the cache"""
+        bucket = self.graph_cache().ttl
+        return (
+            _id,
+            json.dumps(filter, sort_keys=True),
+            calendar.timegm(past.utctimetuple()) // bucket,
+            calendar.timegm(now.utctimetuple()) // bucket
+        )
 
-        # 800 and 355 pixels.
-        ticks = 5
-        width = 8
-        height = 3.55
-
-        dpi = 100
-        bgcolor = '#f3f6f6'
-
-        font = {
-            'size': 16,
-            'family': 'Arial'
-        }
-        plt.rc('font', **font)
-
-        diff_sec = int(difference.total_seconds())
-
-        if diff_sec < 86400:
-            x_no_ticks = 10
-            fmt = '%H:%M'
-        elif (3600*24) < diff_sec and diff_sec < (3600*24*4):
-            x_no_ticks = 5
-            fmt = '%d %b, %H:%M'
-        elif (3600*24*4) < diff_sec:
-            x_no_ticks = 6
-            fmt = '%d %b %Y'
-
-        # size of figure and setting background color
-        fig = plt.gcf()
-        fig.set_size_inches(width, height)
-        fig.set_facecolor(bgcolor)
-
-        # axis color, no ticks and bottom line in grey color.
-        ax = plt.axes(axisbg=bgcolor, frameon=True)
-        ax.xaxis.set_ticks_position('none')
-        ax.spines['bottom'].set_color('#aabcc2')
-        ax.yaxis.set_ticks_position('none')
-
-        # removing all but bottom spines
-        for key, sp in ax.spines.items():
-            if key != 'bottom':
-                sp.set_visible(False)
-
-        # setting amounts of ticks on y axis
-        yloc = plt.MaxNLocator(ticks)
-        ax.yaxis.set_major_locator(yloc)
-
-        # Deciding how many ticks we want on the graph
-        locator = AutoDateLocator(minticks=(x_no_ticks - 2), maxticks=x_no_ticks)
-        formatter = DateFormatter(fmt)
-
-        ax.xaxis.set_major_locator(locator)
-        ax.xaxis.set_major_formatter(formatter)
-
-        # turns off small ticks
-        plt.tick_params(axis='x',
-                        which='both',
-                        bottom='on',
-                        top='off',
-                        pad=10)
-        # Can't seem to set label color differently, changing tick_params color changes labels.
-        ax.xaxis.label.set_color('#FFFFFF')
-
-        # setting dates in x-axis automatically triggers use of AutoDateLocator
-        x = [datetime.fromtimestamp(point['x']) for point in device['data']]
-        y = [point['y'] for point in device['data']]
-        plt.plot(x, y, color='#53b4d4', linewidth=2)
-
-        # pick values for y-axis
-        y_ticks_values = np.array([point['y'] for point in device['data']])
-        y_ticks = np.linspace(y_ticks_values.min(), y_ticks_values.max(), ticks)
-        y_ticks = np.round(y_ticks, decimals=2)
-        plt.yticks(y_ticks, [str(val) + self.extract_unit(device) for val in y_ticks])
-        # plt.ylim(ymin=0.1)  # Only show values of a certain threshold.
-
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf,
-                    format='png',
-                    facecolor=fig.get_facecolor(),
-                    dpi=dpi)
-        buf.seek(0)
-        filename = 'graph-{}.png'.format(int(time.time()))
-        with io.open(filename, 'wb') as f:
-            f.write(buf.read())
-        plt.close()
-        return filename
+    def upload_graph(self, png, filename):
+        """Upload PNG bytes straight from memory"""
+        return self.server.outbox.upload(io.BytesIO(png), filename, self.msg['channel'])
 
     def get_metrics(self, metrics, name, period):
-        devices = self.device.list()
-        _id = self.find_id(name, [], devices)
+        _id = self.inventory.find_id(name, ['devices'])
         if not _id:
             return 'I couldn\'t find your device.'
 
+        unknown = self.unknown_metric(_id, metrics, name)
+        if unknown:
+            return unknown
+
         metrics_names = metrics.split('.')
         _, filter = self.metric_filter(metrics_names)
 
@@ -152,50 +89,64 @@ class Wrapper(BaseWrapper):
         if past > now:
             return 'Hey, I can\'t predict your data into the future, your date has to be in the past and now your date is {}'.format(past)
 
-        metrics_data = self.metrics.get(_id, past, now, filter)
-        device, names = self.get_data(metrics_data)
-        if not device.get('data'):
-            text = ('It might be that your device is offline or has no metrics for `{}`.'.format(metrics) +
-                    'You can see what metrics are available by using `sdbot devices available {}`'.format(name))
-            return text
-
-        # creates file
-        try:
-            slack = Slacker(self.server.config['resource']['SlackBotAccessToken'])
-        except KeyError:
-            slack = Slacker(self.server.config['token'])
-        slack.chat.post_message(
-            self.msg['channel'],
-            'Preparing the graphs for you this very moment',
-            as_user=self.server.slack.server.username
-        )
-
-        filename = self.create_graph(device, now - past)
+        slack = self.server.outbox
+        cache = self.graph_cache()
+        key = self.graph_key(_id, filter, past, now)
+        graph = cache.get(key)
+        if graph is None:
+            device, names = self.fetch_series(_id, metrics, past, now)
+            if not device.get('data'):
+                unknown = self.unknown_metric(_id, metrics, name, fetch=True)
+                if unknown:
+                    return unknown
+                if not self.metric_catalog(_id):
+                    return self.no_metrics(name)
+                text = ('It might be that your device is offline or has no metrics for `{}`.'.format(metrics) +
+                        'You can see what metrics are available by using `sdbot devices available {}`'.format(name))
+                return text
+
+            slack.post_message(
+                self.msg['channel'],
+                'Preparing the graphs for you this very moment',
+                as_user=self.server.slack.server.username
+            )
+
+            graph = {
+                'png': self.create_graph(device, now - past),
+                'names': names,
+                # permalinks of the uploads of this graph, by channel
+                'permalinks': {}
+            }
+            cache.set(key, graph)
 
         attachment = [
             {
-                'text': ('I brought you a graph for {} for the device `{}`'.format(' '.join(names), name) +
+                'text': ('I brought you a graph for {} for the device `{}`'.format(' '.join(graph['names']), name) +
                          '\n A graph is coming up in just a sec.'),
                 'mrkdwn_in': ['text'],
                 'color': COLOR
             }
         ]
 
-        slack.chat.post_message(
+        slack.post_message(
             self.msg['channel'],
             '',
             attachments=attachment,
             as_user=self.server.slack.server.username
         )
 
-        # uploads and sends the graph to channel
-        file_response = slack.files.upload(
-            filename,
-            filename='{}.png'.format(name),
-            channels=self.msg['channel']
-        )
-        # Deletes the graph file after upload so it doesn't litter the container
-        os.remove(filename)
+        permalink = graph['permalinks'].get(self.msg['channel'])
+        if permalink:
+            # this graph is already in the channel, point to it again
+            slack.post_message(
+                self.msg['channel'],
+                permalink,
+                as_user=self.server.slack.server.username
+            )
+        else:
+            # uploads and sends the graph to channel
+            file_response = self.upload_graph(graph['png'], '{}.png'.format(name))
+            graph['permalinks'][self.msg['channel']] = file_response['file'].get('permalink')
 
         return None # We're sending information in function itself this time
 
@@ -223,7 +174,7 @@ def on_message(msg, server):
             'text': 'Look I found a shiny graph for you!'
         }
 
-        server.slack.post_message(
+        server.outbox.post_message(
             msg['channel'],
             '',
             as_user=server.slack.server.username,
@@ -7,38 +7,46 @@
 
 import re
 import logging
-import json
+
+from limbo.registry import HelpPayloads
 
 logger = logging.getLogger(__name__)
 
+# words after `sdbot` that this plugin answers to, '' is a bare `sdbot`
+TRIGGERS = ['help', '']
+
 def on_message(msg, server):
     text = msg.get("text", "")
     logger.debug(text)
-    match = re.findall(r"^[sS][dD][bB]ot help\s?( .*)?", text)
+    match = re.findall(r"^[sS][dD][bB]ot help\b\s*(.*)", text)
 
     if not match:
         match = re.findall(r'^[sS][dD][bB]ot\s?(.?)?$', text)
     if not match:
         return
 
+    # compiled by the registry, so it only changes when the plugins reload
+    payloads = server.hooks.get("help_payloads")
+    if payloads is None:
+        # if no plugin has a docstring, there's no help key
+        payloads = HelpPayloads(server.hooks.get("help", {}))
+
     helptopic = match[0].strip()
     if helptopic:
-        return server.hooks["extendedhelp"].get(helptopic,
-                "No help found for {0}".format(helptopic))
+        attachments = payloads.topic(helptopic)
+        if attachments is None:
+            return "No help found for {0}".format(helptopic)
+        text = ''
     else:
-        # if no plugin has a docstring, there's no help key
-        helpdict = server.hooks.get("help", {})
-        attachments = sorted([attach for attach in helpdict.values()])
-        kwargs = {
-            'attachments': json.dumps(attachments),
-            'text': 'I know lots of commands, try one out!'
-        }
-
-        server.slack.post_message(
-            msg['channel'],
-            '',
-            as_user=server.slack.server.username,
-            **kwargs)
+        attachments = payloads.attachments
+        text = 'I know lots of commands, try one out!'
+
+    server.outbox.post_message(
+        msg['channel'],
+        '',
+        as_user=server.slack.server.username,
+        attachments=attachments,
+        text=text)
 
 def on_channel_joined(msg, server):
     return "Thanks for inviting me to the channel. See what I can do for you by writing `sdbot help`"
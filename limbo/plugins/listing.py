@@ -8,22 +8,50 @@ import re
 import time
 import json
 
-from serverdensity.wrapper import Device
-from serverdensity.wrapper import Service
-from serverdensity.wrapper import Alert
-
 from limbo.plugins.common.basewrapper import BaseWrapper
 
+# words after `sdbot` that this plugin answers to
+TRIGGERS = ['list']
 COMMANDS = ['open alerts', 'services', 'devices', 'help']
 COLOR = '#3EB891'
+# the extended help of every command, built once
+HELP = {
+    'open alerts': {
+        'title': 'Open Alerts',
+        'mrkdwn_in': ['text'],
+        'text': ('The full command for `open alerts` is `open alerts' +
+                 ' <type> <name>` where `type` is either a `device`' +
+                 ', `service` or a `group`. `name` is the name of that ' +
+                 'entity. Both `type` and `name` is optional. If ' +
+                 'none is used I will give you 5 alerts by default, ' +
+                 'if you want all alerts write `list open alerts all` ' +
+                 'instead.'),
+        'color': COLOR
+    },
+    'devices': {
+        'title': 'Devices',
+        'mrkdwn_in': ['text'],
+        'text': ('The full command for `devices` is `devices <number>`' +
+                 ', if a number is not specified I will give you 5 ' +
+                 'devices by default'),
+        'color': COLOR
+    },
+    'services': {
+        'title': 'Services',
+        'mrkdwn_in': ['text'],
+        'text': ('The full command for listing services is ' +
+                 '`sdbot list services <number>`, if a number is not ' +
+                 'specified I will give you 5 services by default'),
+        'color': COLOR
+    }
+}
+HELP_ALL = list(HELP.values())
 
 
 class Wrapper(BaseWrapper):
-    def __init__(self):
-        super(Wrapper, self).__init__()
-        self.device = Device(self.token)
-        self.service = Service(self.token)
-        self.alert = Alert(self.token)
+    def __init__(self, msg, server):
+        super(Wrapper, self).__init__(msg, server)
+        self.alert = self.clients.api().alerts
 
     def results_of(self, command, typeof, name):
         if typeof == 'help' or command == 'help':
@@ -37,7 +65,7 @@ class Wrapper(BaseWrapper):
         return result
 
     def get_services(self, number):
-        services = self.service.list()
+        services = self.inventory.services()
         if number:
             services = services[:int(number)]
         else:
@@ -111,7 +139,7 @@ class Wrapper(BaseWrapper):
         return slack_tcp + slack_http, message
 
     def get_devices(self, number):
-        devices = self.device.list()
+        devices = self.inventory.devices()
         if number:
             devices = devices[:int(number)]
         else:
@@ -150,45 +178,10 @@ class Wrapper(BaseWrapper):
         return slack_formatting, message
 
     def extra_help(self, command):
-        help_command = {
-            'open alerts': {
-                'title': 'Open Alerts',
-                'mrkdwn_in': ['text'],
-                'text': ('The full command for `open alerts` is `open alerts' +
-                         ' <type> <name>` where `type` is either a `device`' +
-                         ', `service` or a `group`. `name` is the name of that ' +
-                         'entity. Both `type` and `name` is optional. If ' +
-                         'none is used I will give you 5 alerts by default, ' +
-                         'if you want all alerts write `list open alerts all` ' +
-                         'instead.'),
-                'color': COLOR
-            },
-            'devices': {
-                'title': 'Devices',
-                'mrkdwn_in': ['text'],
-                'text': ('The full command for `devices` is `devices <number>`' +
-                         ', if a number is not specified I will give you 5 ' +
-                         'devices by default'),
-                'color': COLOR
-            },
-            'services': {
-                'title': 'Services',
-                'mrkdwn_in': ['text'],
-                'text': ('The full command for listing services is ' +
-                         '`sdbot list services <number>`, if a number is not ' +
-                         'specified I will give you 5 services by default'),
-                'color': COLOR
-            }
-        }
-
-        if command == 'open alerts':
-            helptext = [help_command['open alerts']]
-        elif command == 'devices':
-            helptext = [help_command['devices']]
-        elif command == 'services':
-            helptext = [help_command['services']]
-        elif command == 'help':
-            helptext = [attachment for attachment in help_command.values()]
+        if command == 'help':
+            helptext = HELP_ALL
+        else:
+            helptext = [HELP[command]]
         return helptext, ''
 
     def list_alerts(self, command, typeof, name):
@@ -204,11 +197,8 @@ class Wrapper(BaseWrapper):
             text = 'Instead of `{}` you should have used `group`, `service`, `device` or `all`'.format(typeof), ''
             return text
 
-        services = self.service.list()
-        devices = self.device.list()
-
         if name:
-            _id = name if not name else self.find_id(name, services, devices)
+            _id = name if not name else self.inventory.find_id(name)
             params['filter']['config.subjectId'] = _id
 
         if typeof == 'group':
@@ -231,7 +221,7 @@ class Wrapper(BaseWrapper):
             triggered_time = time.localtime(alert['config']['lastTriggeredAt']['sec'])
 
             _id = alert['config']['subjectId']
-            name = self.find_name(_id, services, devices)
+            name = self.inventory.find_name(_id)
             attachment = {
                 'title': '{}'.format(name),
                 'text': '{} {} {}'.format(
@@ -280,7 +270,7 @@ def on_message(msg, server):
                 ' you could try one of these commands `find`, `status`, `value` or `metrics`')
         return text
 
-    api = Wrapper()
+    api = Wrapper(msg, server)
     results, message = api.results_of(command, typeof, name)
     if isinstance(results, list):
         kwargs = {
@@ -288,7 +278,7 @@ def on_message(msg, server):
             'text': message
         }
 
-        server.slack.post_message(
+        server.outbox.post_message(
             msg['channel'],
             '',
             as_user=server.slack.server.username,
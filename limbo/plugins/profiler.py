@@ -0,0 +1,52 @@
+"""{
+    "title": "profile <command>",
+    "text": "Runs a command under the profiler and shows where its time went, `sdbot profile --memory <command>` shows memory too. Only for the admins in LIMBO_ADMINS.",
+    "mrkdwn_in": ["text"],
+    "color": "#71CADC"
+}"""
+import re
+
+from limbo.handlers import handle_message
+from limbo.profiling import ProfilerBusy, profile
+
+# words after `sdbot` that this plugin answers to
+TRIGGERS = ['profile']
+TOP = 15
+# Slack cuts long messages, keep the report well under the limit
+MAX_REPORT = 3500
+
+
+def is_admin(msg, server):
+    admins = (server.config or {}).get('admins') or ''
+    admins = [admin.strip() for admin in admins.split(',') if admin.strip()]
+    user = msg.get('user')
+    if user in admins:
+        return True
+    try:
+        return server.slack.server.users[user].name in admins
+    except (KeyError, AttributeError):
+        return False
+
+
+def on_message(msg, server):
+    text = msg.get("text", "")
+    # slack likes to turn -- into an em dash
+    match = re.findall(u"^[sS][dD][bB]ot profile\\s+((?:--|\u2014)memory\\s+)?(.+)", text)
+    if not match:
+        return
+    memory, command = match[0]
+    command = command.strip()
+
+    if not is_admin(msg, server):
+        return 'Sorry, only admins can profile commands'
+    if command.split()[0].lower() == 'profile':
+        return 'I can\'t profile the profiler'
+
+    event = dict(msg, text=u'sdbot ' + command)
+    try:
+        result, report = profile(handle_message, event, server,
+                                 profile_top=TOP, profile_memory=bool(memory))
+    except ProfilerBusy:
+        return 'Someone is already profiling memory, try again when they\'re done'
+    report = u'```{0}```'.format(report[:MAX_REPORT])
+    return u'\n'.join(reply for reply in (result, report) if reply)
@@ -5,29 +5,67 @@
     "color": "#8E44AD"
 }"""
 
+import functools
 import json
-import requests
 import re
 
 from datetime import timedelta
 from datetime import datetime
 
-from serverdensity.wrapper import Service
-from serverdensity.wrapper import Metrics
-from serverdensity.wrapper import ServiceStatus
 from limbo.plugins.common.basewrapper import BaseWrapper
+from limbo.utils import run_concurrently
+from limbo.utils.cache import TTLCache
 
-COMMANDS = ['status', 'find', 'list', 'help']
+# words after `sdbot` that this plugin answers to
+TRIGGERS = ['service', 'services']
+COMMANDS = ['status', 'value', 'find', 'list', 'help']
 BASEURL = 'https://api.serverdensity.io/'
 COLOR = '#8E44AD'
+# the extended help of every command, built once
+HELP = {
+    'status': {
+        'title': 'Overall Status',
+        'mrkdwn_in': ['text'],
+        'text': ('Overall Status displays statistics about your services. ' +
+                 'It includes _Round trip time_, _Response Time_, ' +
+                 '_Status Code_ and _Status of location_. To get ' +
+                 'the status of a service you can type `sdbot services status serviceName`'),
+        'color': COLOR
+    },
+    'value': {
+        'title': 'Response Times',
+        'mrkdwn_in': ['text'],
+        'text': ('To get the latest and the average response time of a service ' +
+                 'over the last 30 minutes from each of its locations, ' +
+                 'type `sdbot services value serviceName`'),
+        'color': COLOR
+    },
+    'find': {
+        'title': 'Find a Service',
+        'mrkdwn_in': ['text'],
+        'text': ('You can find a service by typing `sdbot services find serviceName`. ' +
+                 'I can also accept regex for the argument `serviceName`. ' +
+                 'For example `sdbot services find 2$`.'),
+        'color': COLOR
+    },
+    'list': {
+        'title': 'List All Services',
+        'mrkdwn_in': ['text'],
+        'text': ('For a list of all services, type `sdbot services list <no>`.' +
+                 'In this case `<no>` is a number. If you leave it out I will ' +
+                 'list the first 5 services.'),
+        'color': COLOR
+    }
+}
+HELP_ALL = list(HELP.values())
 
 
 class Wrapper(BaseWrapper):
     def __init__(self, msg, server):
         super(Wrapper, self).__init__(msg, server)
-        self.service = Service(self.token)
-        self.metrics = Metrics(self.token)
-        self.status = ServiceStatus(self.token)
+        api = self.clients.api()
+        self.service = api.services
+        self.metrics = api.metrics
 
     def results_of(self, command, name):
         if command == 'help' or name == 'help':
@@ -43,42 +81,10 @@ class Wrapper(BaseWrapper):
         return result
 
     def extra_help(self, command):
-        help_command = {
-            'status': {
-                'title': 'Overall Status',
-                'mrkdwn_in': ['text'],
-                'text': ('Overall Status displays statistics about your services. ' +
-                         'It includes _Round trip time_, _Response Time_, ' +
-                         '_Status Code_ and _Status of location_. To get ' +
-                         'the status of a service you can type `sdbot services status serviceName`'),
-                'color': COLOR
-            },
-            'find': {
-                'title': 'Find a Service',
-                'mrkdwn_in': ['text'],
-                'text': ('You can find a service by typing `sdbot services find serviceName`. ' +
-                         'I can also accept regex for the argument `serviceName`. ' +
-                         'For example `sdbot services find 2$`.'),
-                'color': COLOR
-            },
-            'list': {
-                'title': 'List All Services',
-                'mrkdwn_in': ['text'],
-                'text': ('For a list of all services, type `sdbot services list <no>`.' +
-                         'In this case `<no>` is a number. If you leave it out I will ' +
-                         'list the first 5 services.'),
-                'color': COLOR
-            }
-        }
-
-        if command == 'status':
-            helptext = [help_command['status']]
-        elif command == 'find':
-            helptext = [help_command['find']]
-        elif command == 'list':
-            helptext = [help_command['list']]
-        elif command == 'help':
-            helptext = [attachment for attachment in help_command.values()]
+        if command == 'help':
+            helptext = HELP_ALL
+        else:
+            helptext = [HELP[command]]
         return helptext, ''
 
     def _format_services(self, http, tcp):
@@ -152,7 +158,7 @@ class Wrapper(BaseWrapper):
                 text = '{} is not a number, now is it. You see, it needs to be.'.format(number)
                 return text, ''
 
-        services = self.service.list()
+        services = self.inventory.services()
         if number:
             services_trunc = services[:number]
         else:
@@ -169,7 +175,7 @@ class Wrapper(BaseWrapper):
 
     def find_service(self, name):
 
-        services = self.service.list()
+        services = self.inventory.services()
         http = [s for s in services if s['checkType'] == 'http' and
                 re.search(name, s['name'])]
         tcp = [s for s in services if s['checkType'] == 'tcp' and
@@ -178,20 +184,16 @@ class Wrapper(BaseWrapper):
         return self._format_services(http, tcp), ''
 
     def get_value(self, name):
-        services = self.service.list()
-        _id = self.find_id(name, services, [])
+        _id = self.inventory.find_id(name, ['services'])
         if not _id:
             return 'I couldn\'t find your service', ''
         service = self.service.view(_id)
         locations = service['checkLocations']
-        all_results = []
-        for location in locations:
-            filtered = {'time': {location: 'all'}}
-            now = datetime.now()
-            past30 = now - timedelta(minutes=35)
+        now = datetime.now()
+        past30 = now - timedelta(minutes=35)
 
-            metrics = self.metrics.get(_id, past30, now, filtered)
-            service = metrics[0]['tree'][0]
+        all_results = []
+        for service in self.location_metrics(_id, locations, past30, now):
             data = service['data']
             try:
                 latest = '{}s'.format(round(data[-1]['y'], 3))
@@ -221,24 +223,62 @@ class Wrapper(BaseWrapper):
         message = 'Here is the latest values for the {} locations of the service {}'.format(len(locations), name)
         return all_results, message
 
-    def real_name(self, _id, nodes):
-        for node in nodes:
-            if _id == node['id']:
-                return node['name']
+    def location_metrics(self, _id, locations, start, end):
+        """Return the response time series of every location of a service.
+
+        All locations are asked for in a single request. Any location the
+        answer leaves out is fetched on its own, concurrently with the rest.
+        """
+        filtered = {'time': dict((location, 'all') for location in locations)}
+        metrics = self.metrics.get(_id, start, end, filtered)
+        tree = metrics[0].get('tree', []) if metrics else []
+        by_location = dict((node.get('key'), node) for node in tree)
+
+        missing = [location for location in locations if location not in by_location]
+        if missing:
+            calls = [functools.partial(self._single_location_metrics, _id, location, start, end)
+                     for location in missing]
+            by_location.update(zip(missing, run_concurrently(calls)))
+        return [by_location[location] for location in locations]
+
+    def _single_location_metrics(self, _id, location, start, end):
+        # each thread needs an ApiClient of its own
+        metrics = self.clients.api().metrics.get(_id, start, end, {'time': {location: 'all'}})
+        return metrics[0]['tree'][0]
+
+    def node_names(self):
+        """Return the names of the service monitoring nodes by id. The nodes
+        hardly ever change, so they are only downloaded once an hour"""
+        cache = self.server.context.get('service_nodes', lambda: TTLCache(
+            maxsize=1,
+            ttl=int(self.server.config.get('nodes_ttl', 3600))
+        ))
+        names = cache.get('nodes')
+        if names is None:
+            base_url = (self.clients.base_url or BASEURL).rstrip('/') + '/'
+            nodes = self.clients.session.get(base_url + 'service-monitor/nodes', params={'token': self.token})
+            names = dict((node['id'], node['name']) for node in nodes.json())
+            cache.set('nodes', names)
+        return names
 
     def get_status(self, name):
-        services = self.service.list()
-        _id = self.find_id(name, services, [])
-        if not _id:
+        def find_statuses():
+            _id = self.inventory.find_id(name, ['services'])
+            if not _id:
+                return None
+            # each thread needs an ApiClient of its own
+            return self.clients.api().service_status.location(_id)
+
+        # the nodes don't depend on the service, so fetch them at the same time
+        statuses, names = run_concurrently([find_statuses, self.node_names])
+        if statuses is None:
             return 'I couldn\'t find your service', ''
-        nodes = requests.get(BASEURL + 'service-monitor/nodes', params={'token': self.token})
-        statuses = self.status.location(_id)
 
         all_results = []
         for status in statuses:
 
             result = {
-                'title': self.real_name(status['location'], nodes.json()),
+                'title': names.get(status['location']),
                 'color': COLOR,
                 'fields': [
                     {
@@ -296,7 +336,7 @@ def on_message(msg, server):
             'text': message
         }
 
-        server.slack.post_message(
+        server.outbox.post_message(
             msg['channel'],
             '',
             as_user=server.slack.server.username,
@@ -0,0 +1,46 @@
+"""{
+    "title": "stats",
+    "text": "How long each command takes to answer and how often it fails, plus the time spent waiting on Server Density and Slack.",
+    "mrkdwn_in": ["text"],
+    "color": "#71CADC"
+}"""
+from limbo.stats import STATS
+
+# words after `sdbot` that this plugin answers to
+TRIGGERS = ['stats']
+TOP = 15
+
+
+def ms(seconds):
+    return '{0:.0f}ms'.format(seconds * 1000)
+
+
+def table(title, rows):
+    lines = ['{0:<32} {1:>7} {2:>8} {3:>8} {4:>8} {5:>7}'.format(title, 'count', 'p50', 'p95', 'p99', 'errors')]
+    for name, summary in rows[:TOP]:
+        lines.append('{0:<32} {1:>7} {2:>8} {3:>8} {4:>8} {5:>6.1f}%'.format(
+            name[:32], summary['count'], ms(summary['p50']), ms(summary['p95']),
+            ms(summary['p99']), summary['error_rate'] * 100))
+    return '\n'.join(lines)
+
+
+def slowest(metric, name):
+    rows = [(name(dict(labels)), summary) for _, labels, summary in STATS.summaries(metric)]
+    return sorted(rows, key=lambda row: row[1]['p95'], reverse=True)
+
+
+def on_message(msg, server):
+    text = msg.get("text", "")
+    if text.strip().lower() != 'sdbot stats':
+        return
+
+    sections = [
+        ('command', slowest('limbo_plugin_seconds',
+                            lambda labels: '{0} {1}'.format(labels['plugin'], labels['command']))),
+        ('server density', slowest('limbo_serverdensity_seconds', lambda labels: labels['endpoint'])),
+        ('slack', slowest('limbo_slack_seconds', lambda labels: labels['method'])),
+    ]
+    tables = [table(title, rows) for title, rows in sections if rows]
+    if not tables:
+        return 'I haven\'t timed anything yet'
+    return '```' + '\n\n'.join(tables) + '```'
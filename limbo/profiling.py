@@ -0,0 +1,77 @@
+import cProfile
+import os
+import pstats
+import threading
+
+try:
+    import tracemalloc
+except ImportError:
+    # python 2 has no tracemalloc, memory profiling is skipped there
+    tracemalloc = None
+
+# tracemalloc is global to the process, so only one profile traces memory
+# at a time
+_memory_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    def __init__(self):
+        super(ProfilerBusy, self).__init__("memory is already being profiled")
+
+
+def profile(func, *args, **kwargs):
+    """Run func(*args, **kwargs) under cProfile and return its result with a
+    report of the top functions by cumulative time.
+
+    Keyword arguments for profile itself, taken out of kwargs:
+    profile_top: how many functions (and allocation sites) to report
+    profile_memory: also trace allocations with tracemalloc and report
+    the lines that allocated the most. Raises ProfilerBusy if another
+    thread is doing that already
+    """
+    top = kwargs.pop("profile_top", 20)
+    memory = kwargs.pop("profile_memory", False) and tracemalloc is not None
+
+    if memory and not _memory_lock.acquire(False):
+        raise ProfilerBusy()
+    profiler = cProfile.Profile()
+    if memory:
+        tracemalloc.start()
+    try:
+        result = profiler.runcall(func, *args, **kwargs)
+    finally:
+        snapshot = tracemalloc.take_snapshot() if memory else None
+        if memory:
+            tracemalloc.stop()
+            _memory_lock.release()
+
+    report = time_report(profiler, top)
+    if snapshot is not None:
+        report += "\n\n" + memory_report(snapshot, top)
+    return result, report
+
+
+def _where(filename, line, name):
+    if filename == "~":
+        # builtins have no file
+        return name
+    return "{0}:{1}({2})".format(os.path.basename(filename), line, name)
+
+
+def time_report(profiler, top=20):
+    stats = pstats.Stats(profiler)
+    stats.sort_stats("cumulative")
+    lines = ["{0:>9} {1:>9} {2:>8}  {3}".format("cumtime", "tottime", "calls", "function")]
+    for func in stats.fcn_list[:top]:
+        _, calls, tottime, cumtime, _ = stats.stats[func]
+        lines.append("{0:>9.3f} {1:>9.3f} {2:>8}  {3}".format(cumtime, tottime, calls, _where(*func)))
+    return "\n".join(lines)
+
+
+def memory_report(snapshot, top=20):
+    lines = ["{0:>10} {1:>8}  {2}".format("allocated", "blocks", "line")]
+    for stat in snapshot.statistics("lineno")[:top]:
+        frame = stat.traceback[0]
+        lines.append("{0:>8.1f}KB {1:>8}  {2}:{3}".format(
+            stat.size / 1024.0, stat.count, os.path.basename(frame.filename), frame.lineno))
+    return "\n".join(lines)
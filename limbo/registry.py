@@ -0,0 +1,298 @@
+from __future__ import print_function
+import ast
+import functools
+from glob import glob
+import importlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+
+from .handlers import CommandRouter
+from .settings import CONFIG
+from .utils import strip_extension
+
+CURDIR = os.path.abspath(os.path.dirname(__file__))
+DIR = functools.partial(os.path.join, CURDIR)
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidPluginDir(Exception):
+    def __init__(self, plugindir):
+        message = "Unable to find plugin dir {0}".format(plugindir)
+        super(InvalidPluginDir, self).__init__(message)
+
+
+class PluginRegistry(object):
+    """The hooks and help texts of a set of plugins.
+
+    A registry is built once per process and shared by every bot, so it
+    must be treated as read-only. Anything that belongs to a single Slack
+    team lives in that bot's TenantContext instead.
+
+    Plugins are registered from their manifest and only imported when one
+    of their hooks first runs, see LazyPlugin.
+    """
+    def __init__(self, plugindir=None, plugins_to_load=None):
+        self.plugindir = plugindir
+        self.plugins_to_load = plugins_to_load
+        self.plugins = {}
+        start = time.time()
+        self.hooks = load_plugins(plugindir, plugins_to_load, self.plugins)
+        self.load_seconds = time.time() - start
+
+    def import_all(self):
+        """Import every plugin that hasn't been yet"""
+        for plugin in self.plugins.values():
+            plugin.load()
+
+    def import_times(self):
+        """{plugin: seconds its import took}, None if not imported yet"""
+        return dict((name, plugin.seconds) for name, plugin in self.plugins.items())
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(plugindir=None, plugins_to_load=None, reload=False):
+    """Return the shared registry for plugindir and plugins_to_load,
+    importing the plugins the first time it's asked for"""
+    plugins_to_load = _plugin_list(plugins_to_load)
+    key = (plugindir, tuple(plugins_to_load))
+    with _registries_lock:
+        if reload or key not in _registries:
+            _registries[key] = PluginRegistry(plugindir, plugins_to_load)
+        return _registries[key]
+
+
+def _plugin_list(plugins_to_load):
+    if not plugins_to_load:
+        return []
+    if isinstance(plugins_to_load, (list, tuple)):
+        return list(plugins_to_load)
+    return plugins_to_load.split(",")
+
+
+def read_manifest(path):
+    """What registering a plugin needs, read from its source without
+    importing it: {"doc", "triggers", "hooks"}. Returns None when the source
+    can't be read that way, such as a TRIGGERS that isn't a literal or a
+    hook that isn't a plain function, and the plugin is imported instead"""
+    try:
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), path)
+    except (IOError, OSError, SyntaxError, ValueError):
+        return None
+
+    manifest = {"doc": ast.get_docstring(tree, clean=False), "triggers": None, "hooks": []}
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name.startswith("on_"):
+            manifest["hooks"].append(node.name[3:])
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            if any((alias.asname or alias.name).startswith("on_") for alias in node.names):
+                return None
+        elif isinstance(node, ast.Assign):
+            names = [target.id for target in node.targets if isinstance(target, ast.Name)]
+            if any(name.startswith("on_") for name in names):
+                return None
+            if "TRIGGERS" in names:
+                try:
+                    manifest["triggers"] = ast.literal_eval(node.value)
+                except ValueError:
+                    return None
+    manifest["hooks"].sort()
+    return manifest
+
+
+# plugins are imported by name from their plugindir, which is only on
+# sys.path while one is imported
+_import_lock = threading.RLock()
+
+
+class LazyPlugin(object):
+    """A plugin module that is imported, along with everything it imports,
+    the first time it's needed. An import that fails is logged once and
+    the plugin's hooks do nothing from then on"""
+    def __init__(self, name, plugindir):
+        self.name = name
+        self.plugindir = plugindir
+        self.module = None
+        self.failed = False
+        self.seconds = None
+
+    def load(self):
+        if self.module is not None or self.failed:
+            return self.module
+        with _import_lock:
+            if self.module is not None or self.failed:
+                return self.module
+            start = time.time()
+            sys.path.insert(0, self.plugindir)
+            try:
+                self.module = importlib.import_module(self.name)
+            # bare except, because the modules could raise any number of errors
+            # on import, and we want them not to kill our server
+            except:
+                self.failed = True
+                logger.warning("import failed on module {0}, module not loaded".format(self.name))
+                logger.warning("{0}".format(sys.exc_info()[0]))
+                logger.warning("{0}".format(traceback.format_exc()))
+            finally:
+                sys.path.remove(self.plugindir)
+                self.seconds = time.time() - start
+            logger.debug("plugin: imported %s in %.3fs", self.name, self.seconds)
+        return self.module
+
+
+class LazyHook(object):
+    """Stands in for a plugin's on_<hook> function until it is imported"""
+    def __init__(self, plugin, hook):
+        self.plugin = plugin
+        self.hook = hook
+        # what STATS labels the plugin's timings with
+        self.__module__ = plugin.name
+
+    def __call__(self, *args):
+        mod = self.plugin.load()
+        if mod is None:
+            return None
+        return getattr(mod, "on_" + self.hook)(*args)
+
+    def __repr__(self):
+        return "<hook {0} of {1}>".format(self.hook, self.plugin.name)
+
+
+class HelpPayloads(object):
+    """The help attachments of every plugin, serialized once when the
+    registry is built so `sdbot help` only has to send them.
+
+    attachments is the JSON of every plugin's attachment, by title.
+    topics maps each plugin's name and command words to the JSON of its
+    own attachment.
+    """
+    def __init__(self, help, topics=None):
+        self.attachments = json.dumps(sorted(help.values(), key=lambda attachment: attachment.get("title", "")))
+        self.topics = {}
+        for topic, name in (topics or {}).items():
+            if name in help:
+                self.topics[topic] = json.dumps([help[name]])
+        for name, attachment in help.items():
+            self.topics[name] = json.dumps([attachment])
+
+    def topic(self, name):
+        """The JSON attachments for `sdbot help name`, None if there's no
+        such topic"""
+        return self.topics.get(name)
+
+
+def _register(plugin, hooks, router, topics, hooknames, triggers, doc):
+    for hook in hooknames:
+        hookfun = LazyHook(plugin, hook)
+        logger.debug("plugin: attaching %s hook for %s", hook, plugin.name)
+        hooks.setdefault(hook, []).append(hookfun)
+        if hook == "message":
+            router.add(hookfun, triggers)
+
+    if doc:
+        part_attachment = json.loads(doc)
+        hooks.setdefault('help', {})[plugin.name] = part_attachment
+        hooks.setdefault('extendedhelp', {})[plugin.name] = doc
+        for word in triggers or []:
+            if word:
+                topics.setdefault(word, plugin.name)
+
+
+def load_plugins(plugindir, plugins_to_load=None, plugins=None):
+    """The hooks of the plugins in plugindir. plugins, if given, is filled
+    with the LazyPlugin of every plugin by name"""
+    if plugindir and not os.path.isdir(plugindir):
+        raise InvalidPluginDir(plugindir)
+
+    if not plugindir:
+        plugindir = DIR("plugins")
+
+    logger.debug("plugindir: {0}".format(plugindir))
+
+    if os.path.isdir(plugindir):
+        pluginfiles = glob(os.path.join(plugindir, "[!_]*.py"))
+        plugins_found = strip_extension(os.path.basename(p) for p in pluginfiles)
+    else:
+        # we might be in an egg; try to get the files that way
+        logger.debug("trying pkg_resources")
+        import pkg_resources
+        try:
+            plugins_found = strip_extension(
+                    pkg_resources.resource_listdir(__name__, "plugins"))
+        except OSError:
+            raise InvalidPluginDir(plugindir)
+
+    plugins_to_load = _plugin_list(plugins_to_load)
+    plugins = {} if plugins is None else plugins
+    hooks = {}
+    router = CommandRouter()
+    topics = {}
+
+    for name in plugins_found:
+        if plugins_to_load and name not in plugins_to_load:
+            logger.debug("skipping plugin {0}, not in plugins_to_load {1}".format(name, plugins_to_load))
+            continue
+
+        logger.debug("plugin: {0}".format(name))
+        plugin = LazyPlugin(name, plugindir)
+        manifest = read_manifest(os.path.join(plugindir, name + ".py"))
+        try:
+            if manifest is None:
+                # no manifest to go by, so import it now to find its hooks
+                mod = plugin.load()
+                if mod is None:
+                    continue
+                _register(plugin, hooks, router, topics,
+                          re.findall(r"on_(\w+)", " ".join(dir(mod))),
+                          getattr(mod, "TRIGGERS", None), mod.__doc__)
+            else:
+                _register(plugin, hooks, router, topics,
+                          manifest["hooks"], manifest["triggers"], manifest["doc"])
+            plugins[name] = plugin
+
+        # bare except, because the modules could raise any number of errors
+        # on import, and we want them not to kill our server
+        except:
+            logger.warning("import failed on module {0}, module not loaded".format(name))
+            logger.warning("{0}".format(sys.exc_info()[0]))
+            logger.warning("{0}".format(traceback.format_exc()))
+
+    # only route messages if some plugin says which commands it handles
+    if router.commands:
+        hooks["router"] = router
+    if "help" in hooks:
+        hooks["help_payloads"] = HelpPayloads(hooks["help"], topics)
+    return hooks
+
+
+def report(registry):
+    """How long building the registry took, then every plugin's import
+    time, slowest first"""
+    lines = ["{0:<24} {1:>9.1f}ms".format("registry", registry.load_seconds * 1000)]
+    times = sorted(registry.import_times().items(), key=lambda item: -(item[1] or 0))
+    for name, seconds in times:
+        if registry.plugins[name].failed:
+            lines.append("{0:<24} {1:>11}".format(name, "failed"))
+        elif seconds is None:
+            lines.append("{0:<24} {1:>11}".format(name, "not loaded"))
+        else:
+            lines.append("{0:<24} {1:>9.1f}ms".format(name, seconds * 1000))
+    return "\n".join(lines)
+
+
+def main(args):
+    """Build the registry, import every plugin and print what each took,
+    for bin/limbo imports"""
+    registry = PluginRegistry(args.pluginpath, CONFIG.get("plugins"))
+    registry.import_all()
+    print(report(registry))
@@ -0,0 +1,296 @@
+"""Replays a stream of RTM events through the real Slackbot loop, for
+measuring end to end throughput and reply latency.
+
+Events come from a JSONL file, one event per line, or are generated. They
+are fed to the loop at a chosen rate through a fake RTM connection, which
+wakes the loop up the same way the websocket does. Every message the bot
+sends is recorded with the time it went out. A reply is matched to the
+oldest event that expects one in the same channel, so the latency of
+replies that the outbox joined together is only counted once.
+"""
+from __future__ import print_function
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections import deque
+
+from .fakeserver import FakeServer, FakeSlack, FakeSlackServer, FakeSlackWeb
+from .outbox import Outbox
+from .settings import CONFIG
+from .stats import percentile
+
+logger = logging.getLogger(__name__)
+
+COMMANDS = [
+    u'sdbot help',
+    u'sdbot stats',
+    u'sdbot devices list',
+    u'sdbot devices find device-1',
+    u'sdbot alerts list',
+    u'sdbot services list',
+]
+CHATTER = [
+    u'morning all',
+    u'anyone up for lunch?',
+    u'the deploy is done',
+    u'can someone look at the build',
+]
+
+
+class ReplayFinished(Exception):
+    pass
+
+
+def generate(n, seed=0, channels=10, commands=COMMANDS):
+    """n events like a busy team sends: chatter, bot commands, other bots,
+    channel joins and presence noise"""
+    rng = random.Random(seed)
+    events = []
+    for i in range(n):
+        channel = u'C{0:03d}'.format(rng.randrange(channels))
+        kind = rng.random()
+        if kind < 0.35:
+            event = {'type': 'message', 'channel': channel, 'user': '2', 'text': rng.choice(CHATTER)}
+        elif kind < 0.6:
+            event = {'type': 'message', 'channel': channel, 'user': '2', 'text': rng.choice(commands)}
+        elif kind < 0.65:
+            event = {'type': 'message', 'subtype': 'bot_message', 'channel': channel,
+                     'bot_id': '1', 'text': u'build passed'}
+        elif kind < 0.7:
+            event = {'type': 'channel_joined', 'channel': {'id': channel}}
+        elif kind < 0.85:
+            event = {'type': 'presence_change', 'user': '2',
+                     'presence': rng.choice(['active', 'away'])}
+        else:
+            event = {'type': 'user_typing', 'channel': channel, 'user': '2'}
+        event['ts'] = u'{0}.{1:06d}'.format(1500000000 + i, i)
+        events.append(event)
+    return events
+
+
+def load(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save(events, path):
+    with open(path, 'w') as f:
+        for event in events:
+            f.write(json.dumps(event) + '\n')
+
+
+def expects_reply(event):
+    if event.get('type') == 'channel_joined':
+        return True
+    return (event.get('type') == 'message' and not event.get('subtype') and
+            event.get('text', '').lower().startswith('sdbot'))
+
+
+def event_channel(event):
+    channel = event.get('channel')
+    return channel.get('id') if isinstance(channel, dict) else channel
+
+
+class Recorder(object):
+    """The time every event was fed and every message went out"""
+    def __init__(self):
+        self.fed = 0
+        self.first_fed = None
+        self.last_fed = None
+        self.sent = []
+        self.latencies = []
+        self.last_sent = None
+        self._waiting = {}
+        self._lock = threading.Lock()
+
+    def feed(self, event):
+        now = time.time()
+        with self._lock:
+            self.fed += 1
+            self.first_fed = self.first_fed or now
+            self.last_fed = now
+            if expects_reply(event):
+                self._waiting.setdefault(event_channel(event), deque()).append(now)
+
+    def send(self, kind, channel, text):
+        now = time.time()
+        with self._lock:
+            self.sent.append((now, kind, channel, text))
+            self.last_sent = now
+            waiting = self._waiting.get(channel)
+            if waiting:
+                self.latencies.append(now - waiting.popleft())
+
+    def unanswered(self):
+        with self._lock:
+            return sum(len(waiting) for waiting in self._waiting.values())
+
+
+class ReplaySlackServer(FakeSlackServer):
+    """Looks enough like the RTM server for the loop: a socket to wait on
+    and a ping that does nothing"""
+    def __init__(self, sock):
+        super(ReplaySlackServer, self).__init__()
+        self.websocket = type('Websocket', (object,), {'sock': sock})()
+
+    def ping(self):
+        pass
+
+
+class ReplaySlack(FakeSlack):
+    """A Slack client that hands the loop the events of a replay at rate
+    events a second, as fast as it takes them if rate is 0"""
+    def __init__(self, events, recorder, rate=0):
+        self._wake, sock = socket.socketpair()
+        sock.setblocking(False)
+        super(ReplaySlack, self).__init__(server=ReplaySlackServer(sock))
+        self.token = 'replay'
+        self.replay = list(events)
+        self.recorder = recorder
+        self.rate = rate
+        self.finished = False
+        self.fed_all = threading.Event()
+        self._due = deque()
+        self._lock = threading.Lock()
+
+    def rtm_connect(self):
+        thread = threading.Thread(target=self._feed, name='limbo-replay')
+        thread.daemon = True
+        thread.start()
+
+    def rtm_send_message(self, channel, message):
+        self.recorder.send('rtm', channel, message)
+
+    def _feed(self):
+        start = time.time()
+        for n, event in enumerate(self.replay):
+            if self.rate:
+                delay = start + float(n) / self.rate - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            with self._lock:
+                self._due.append(event)
+            self._wake.send(b'x')
+        self.fed_all.set()
+
+    def finish(self):
+        self.finished = True
+        self._wake.send(b'x')
+
+    def rtm_read(self):
+        try:
+            while self.server.websocket.sock.recv(4096):
+                pass
+        except socket.error:
+            # nothing left to read on the non-blocking socket
+            pass
+        if self.finished:
+            raise ReplayFinished()
+        with self._lock:
+            events = list(self._due)
+            self._due.clear()
+        for event in events:
+            self.recorder.feed(event)
+        return events
+
+
+class RecordingSlackWeb(FakeSlackWeb):
+    def __init__(self, recorder):
+        super(RecordingSlackWeb, self).__init__()
+        self.recorder = recorder
+
+    def post_message(self, channel, message, **kwargs):
+        self.recorder.send('post', channel, message)
+        return super(RecordingSlackWeb, self).post_message(channel, message, **kwargs)
+
+    def upload(self, fileobj, filename, channels, **kwargs):
+        self.recorder.send('upload', channels, filename)
+        return super(RecordingSlackWeb, self).upload(fileobj, filename, channels, **kwargs)
+
+
+def replay_server(recorder):
+    """A ServerClass for Slackbot that records what it sends"""
+    class ReplayServer(FakeServer):
+        def __init__(self, slack, config, hooks, db, context=None):
+            super(ReplayServer, self).__init__(slack, config, hooks, db, context)
+            self.web = RecordingSlackWeb(recorder)
+            self.outbox = Outbox(self.web, slack,
+                                 interval=float(config.get('outbox_interval', 1)),
+                                 max_retries=int(config.get('outbox_retries', 3)))
+    return ReplayServer
+
+
+def run(events, rate=0, config=None, drain=1.0, timeout=300):
+    """Replay events through a Slackbot and return its report. After the
+    last event, waits until nothing has been sent for drain seconds"""
+    from .limbo import Slackbot
+
+    config = dict(CONFIG if config is None else config)
+    config.setdefault('resource', {'SD_AUTH_TOKEN': os.environ.get('SD_AUTH_TOKEN', 'replay')})
+    recorder = Recorder()
+    slack = ReplaySlack(events, recorder, rate)
+    bot = Slackbot('replay', ServerClass=replay_server(recorder),
+                   Client=lambda token: slack, config=config)
+
+    def start():
+        try:
+            bot.start()
+        except ReplayFinished:
+            pass
+    thread = threading.Thread(target=start, name='limbo-replay-bot')
+    thread.daemon = True
+    thread.start()
+
+    deadline = time.time() + timeout
+    slack.fed_all.wait(timeout)
+    while time.time() < deadline:
+        time.sleep(drain / 4.0)
+        busy = bot.dispatcher is None or bot.dispatcher.pending() or bot.server.outbox.pending()
+        quiet_since = max(recorder.last_sent or 0, recorder.last_fed or 0)
+        if not busy and time.time() - quiet_since >= drain:
+            break
+    slack.finish()
+    thread.join(timeout)
+    bot.dispatcher.stop()
+    bot.server.outbox.stop()
+    return report(recorder)
+
+
+def report(recorder):
+    latencies = sorted(recorder.latencies)
+    last = max(recorder.last_sent or 0, recorder.last_fed or 0)
+    elapsed = max(last - (recorder.first_fed or last), 1e-9)
+    result = {
+        'events': recorder.fed,
+        'seconds': elapsed,
+        'events_per_second': recorder.fed / elapsed,
+        'sent': len(recorder.sent),
+        'replies': len(latencies),
+        'unanswered': recorder.unanswered(),
+    }
+    for q in (0.5, 0.95, 0.99):
+        result['latency_p{0}'.format(int(q * 100))] = percentile(latencies, q)
+    return result
+
+
+def main(args):
+    """Replay events for bin/limbo replay and print the report"""
+    if args.replay_events:
+        events = load(args.replay_events)
+    else:
+        events = generate(args.replay_count)
+    if args.replay_save:
+        save(events, args.replay_save)
+
+    result = run(events, rate=args.replay_rate)
+    print('{events} events in {seconds:.2f}s, {events_per_second:.1f} events/s'.format(**result))
+    print('{sent} messages sent, {replies} replies matched, {unanswered} unanswered'.format(**result))
+    print('reply latency p50 {0:.1f}ms p95 {1:.1f}ms p99 {2:.1f}ms'.format(
+        result['latency_p50'] * 1000, result['latency_p95'] * 1000, result['latency_p99'] * 1000))
+    if args.replay_output:
+        with open(args.replay_output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
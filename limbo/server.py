@@ -1,14 +1,34 @@
+from .context import TenantContext
+from .outbox import Outbox
+from .slackweb import SlackWebClient
+
+
 class LimboServer(object):
-    def __init__(self, slack, config, hooks, db):
+    def __init__(self, slack, config, hooks, db, context=None):
         self.slack = slack
         self.config = config
         self.hooks = hooks
         self.db = db
+        self.context = context or TenantContext()
+        # for posting messages and uploading files through the Web API
+        self.web = SlackWebClient(slack.token, pool_size=int(config.get("slack_pool_size", 4)))
+        # everything the bot sends goes through here, paced per channel
+        self.outbox = Outbox(self.web, slack,
+                             interval=float(config.get("outbox_interval", 1)),
+                             max_retries=int(config.get("outbox_retries", 3)))
 
     def query(self, sql, *params):
-        c = self.db.cursor()
-        c.execute(sql, params)
-        rows = c.fetchall()
-        c.close()
-        self.db.commit()
-        return rows
+        return self.db.query(sql, *params)
+
+    def iterquery(self, sql, *params):
+        return self.db.iterquery(sql, *params)
+
+    def execute(self, sql, *params):
+        """Queue a write without waiting for it to be committed"""
+        self.db.execute(sql, *params)
+
+    def executemany(self, sql, seq_of_params):
+        self.db.executemany(sql, seq_of_params)
+
+    def executeall(self, statements):
+        self.db.executeall(statements)
@@ -9,6 +9,25 @@ def init_config():
     getif(config, "plugins", "LIMBO_PLUGINS")
     getif(config, "heroku", "LIMBO_ON_HEROKU")
     getif(config, "beepboop", "BEEPBOOP_TOKEN")
+    getif(config, "workers", "LIMBO_WORKERS")
+    getif(config, "queue_size", "LIMBO_QUEUE_SIZE")
+    getif(config, "graph_workers", "LIMBO_GRAPH_WORKERS")
+    getif(config, "graph_timeout", "LIMBO_GRAPH_TIMEOUT")
+    getif(config, "graph_cache_size", "LIMBO_GRAPH_CACHE_SIZE")
+    getif(config, "graph_cache_ttl", "LIMBO_GRAPH_CACHE_TTL")
+    getif(config, "inventory_ttl", "LIMBO_INVENTORY_TTL")
+    getif(config, "inventory_max_age", "LIMBO_INVENTORY_MAX_AGE")
+    getif(config, "sd_pool_size", "LIMBO_SD_POOL_SIZE")
+    getif(config, "slack_pool_size", "LIMBO_SLACK_POOL_SIZE")
+    getif(config, "nodes_ttl", "LIMBO_NODES_TTL")
+    getif(config, "metric_catalog_ttl", "LIMBO_METRIC_CATALOG_TTL")
+    getif(config, "database", "LIMBO_DATABASE")
+    getif(config, "outbox_interval", "LIMBO_OUTBOX_INTERVAL")
+    getif(config, "outbox_retries", "LIMBO_OUTBOX_RETRIES")
+    getif(config, "stats_port", "LIMBO_STATS_PORT")
+    getif(config, "stats_host", "LIMBO_STATS_HOST")
+    getif(config, "admins", "LIMBO_ADMINS")
+    getif(config, "sd_api_url", "LIMBO_SD_API_URL")
     return config
 
 CONFIG = init_config()
@@ -0,0 +1,85 @@
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .stats import STATS
+
+
+class SlackWebError(Exception):
+    def __init__(self, method, error):
+        message = "Slack API call {0} failed: {1}".format(method, error)
+        super(SlackWebError, self).__init__(message)
+        self.method = method
+        self.error = error
+
+
+class SlackRateLimited(SlackWebError):
+    def __init__(self, method, retry_after):
+        super(SlackRateLimited, self).__init__(method, "ratelimited")
+        self.retry_after = retry_after
+
+
+class SlackWebClient(object):
+    """A team's client for the Slack Web API.
+
+    All calls share one session, so they reuse keep-alive connections
+    instead of opening a new one each time. The number of calls, errors
+    and the total time spent are counted per API method in timings.
+    """
+    BASE_URL = "https://slack.com/api/"
+
+    def __init__(self, token, pool_size=4, timeout=10):
+        self.token = token
+        self.timeout = timeout
+        self.session = requests.Session()
+        for prefix in ("https://", "http://"):
+            self.session.mount(prefix, HTTPAdapter(pool_connections=pool_size,
+                                                   pool_maxsize=pool_size))
+        # method -> {"count": n, "errors": n, "seconds": total}
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def api_call(self, method, files=None, **params):
+        params["token"] = self.token
+        start = time.time()
+        ok = False
+        try:
+            response = self.session.post(self.BASE_URL + method, data=params,
+                                         files=files, timeout=self.timeout)
+            if response.status_code == 429:
+                raise SlackRateLimited(method, float(response.headers.get("Retry-After", 1)))
+            response.raise_for_status()
+            body = response.json()
+            if not body.get("ok"):
+                raise SlackWebError(method, body.get("error"))
+            ok = True
+            return body
+        finally:
+            self._record(method, time.time() - start, ok)
+
+    def _record(self, method, seconds, ok):
+        STATS.record("limbo_slack_seconds", (("method", method),), seconds, ok)
+        with self._lock:
+            timing = self.timings.setdefault(method, {"count": 0, "errors": 0, "seconds": 0.0})
+            timing["count"] += 1
+            timing["seconds"] += seconds
+            if not ok:
+                timing["errors"] += 1
+
+    def post_message(self, channel, message, **kwargs):
+        if isinstance(kwargs.get("attachments"), (list, dict)):
+            kwargs["attachments"] = json.dumps(kwargs["attachments"])
+        return self.api_call("chat.postMessage", channel=channel, text=message, **kwargs)
+
+    def upload(self, fileobj, filename, channels, **kwargs):
+        """Upload a file object, without it ever touching the disk"""
+        if isinstance(channels, (list, tuple)):
+            channels = ",".join(channels)
+        return self.api_call("files.upload",
+                             files={"file": (filename, fileobj)},
+                             filename=filename,
+                             channels=channels,
+                             **kwargs)
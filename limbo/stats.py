@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# what each metric times, for the HELP lines of the Prometheus output
+METRICS = {
+    "limbo_plugin_seconds": "Time spent running plugin hooks",
+    "limbo_serverdensity_seconds": "Time spent on Server Density API calls",
+    "limbo_slack_seconds": "Time spent on Slack Web API calls",
+}
+
+
+def percentile(samples, q):
+    """The q quantile of a sorted list of samples, nearest rank"""
+    if not samples:
+        return 0.0
+    return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+class Timer(object):
+    """Counts, errors and total time of one thing being timed, with the
+    latest samples kept for the percentiles"""
+    def __init__(self, samples=1024):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.samples = deque(maxlen=samples)
+
+    def add(self, seconds, ok):
+        self.count += 1
+        self.seconds += seconds
+        self.samples.append(seconds)
+        if not ok:
+            self.errors += 1
+
+    def summary(self):
+        samples = sorted(self.samples)
+        summary = {
+            "count": self.count,
+            "errors": self.errors,
+            "error_rate": float(self.errors) / self.count if self.count else 0.0,
+            "seconds": self.seconds,
+        }
+        for q in QUANTILES:
+            summary["p{0}".format(int(q * 100))] = percentile(samples, q)
+        return summary
+
+
+class Stats(object):
+    """Timers by metric and labels, for the whole process.
+
+    Labels are given as a tuple of (name, value) pairs, so for example a
+    plugin hook is timed under "limbo_plugin_seconds" with
+    (("plugin", "graph"), ("command", "graph")).
+    """
+    def __init__(self, samples=1024, timer=time.time):
+        self.samples = samples
+        self.timer = timer
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def record(self, metric, labels, seconds, ok=True):
+        with self._lock:
+            key = (metric, labels)
+            timer = self._timers.get(key)
+            if timer is None:
+                timer = self._timers[key] = Timer(self.samples)
+            timer.add(seconds, ok)
+
+    @contextmanager
+    def timed(self, metric, labels):
+        """Time the block, it counts as an error if it raises"""
+        start = self.timer()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record(metric, labels, self.timer() - start, ok)
+
+    def summaries(self, metric=None):
+        """[(metric, labels, summary)] sorted by metric and labels"""
+        with self._lock:
+            timers = sorted(self._timers.items())
+            return [(m, labels, timer.summary()) for (m, labels), timer in timers
+                    if metric is None or m == metric]
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+
+    def prometheus(self):
+        """The timers in the Prometheus text exposition format, each metric
+        as a summary plus a counter of its errors"""
+        by_metric = {}
+        for metric, labels, summary in self.summaries():
+            by_metric.setdefault(metric, []).append((labels, summary))
+
+        lines = []
+        for metric in sorted(by_metric):
+            lines.append("# HELP {0} {1}".format(metric, METRICS.get(metric, metric)))
+            lines.append("# TYPE {0} summary".format(metric))
+            for labels, summary in by_metric[metric]:
+                for q in QUANTILES:
+                    lines.append("{0}{1} {2}".format(
+                        metric, _labels(labels + (("quantile", str(q)),)),
+                        summary["p{0}".format(int(q * 100))]))
+                lines.append("{0}_sum{1} {2}".format(metric, _labels(labels), summary["seconds"]))
+                lines.append("{0}_count{1} {2}".format(metric, _labels(labels), summary["count"]))
+
+            errors = metric.replace("_seconds", "") + "_errors_total"
+            lines.append("# HELP {0} Errors among {1}".format(errors, metric))
+            lines.append("# TYPE {0} counter".format(errors))
+            for labels, summary in by_metric[metric]:
+                lines.append("{0}{1} {2}".format(errors, _labels(labels), summary["errors"]))
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{0}="{1}"'.format(
+        name, str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in labels) + "}"
+
+
+# every bot in the process records here
+STATS = Stats()
+
+
+class StatsHandler(BaseHTTPRequestHandler):
+    stats = STATS
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.stats.prometheus().encode("utf8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve STATS on http://host:port/metrics from a background thread,
+    once per process however many bots ask for it"""
+    with _servers_lock:
+        if (host, port) not in _servers:
+            server = HTTPServer((host, port), StatsHandler)
+            thread = threading.Thread(target=server.serve_forever, name="limbo-stats")
+            thread.daemon = True
+            thread.start()
+            logger.debug("serving stats on {0}:{1}".format(host, server.server_port))
+            _servers[(host, port)] = server
+        return _servers[(host, port)]
@@ -0,0 +1,162 @@
+"""Made up Server Density accounts, shaped like the API's answers, for
+benchmarks and for running the bot against a fake API.
+
+Everything is generated from a seed, so the same arguments always give the
+same account.
+"""
+import random
+import time
+
+GROUPS = ['web', 'db', 'cache', 'queue', 'worker', None]
+PROVIDERS = ['amazon', 'google', 'rackspace', 'softlayer', None]
+# service monitoring nodes, by id
+NODES = [
+    ('lon', 'London'),
+    ('nyc', 'New York'),
+    ('sfo', 'San Francisco'),
+    ('sin', 'Singapore'),
+    ('syd', 'Sydney'),
+]
+
+# the metric tree every synthetic device reports, as (group, [(key, name, unit)])
+METRICS = [
+    (('memory', 'Memory'), [
+        ('memSwapFree', 'Swap free', 'MB'),
+        ('memPhysUsed', 'Physical used', 'MB'),
+    ]),
+    (('loadAvrg', 'Load average'), [
+        ('1min', '1 minute', ''),
+    ]),
+    (('networkTraffic', 'Network traffic'), [
+        ('eth0', 'eth0', 'MB/s'),
+    ]),
+]
+
+
+def object_id(rng):
+    """A random 24 character hex id, like a Mongo ObjectId"""
+    return '{0:024x}'.format(rng.getrandbits(96))
+
+
+def devices(n, seed=0, now=None):
+    rng = random.Random(seed)
+    now = now or time.time()
+    return [{
+        '_id': object_id(rng),
+        'type': 'device',
+        'name': 'device-{0}'.format(i),
+        'hostname': 'device-{0}.example.com'.format(i),
+        'group': rng.choice(GROUPS),
+        'provider': rng.choice(PROVIDERS),
+        # most devices are online, some went quiet a while ago
+        'lastPayloadAt': {'sec': int(now - (rng.random() * 60 if rng.random() < 0.9 else rng.random() * 86400))},
+    } for i in range(n)]
+
+
+def services(n, seed=0):
+    rng = random.Random(seed + 1)
+    result = []
+    for i in range(n):
+        service = {
+            '_id': object_id(rng),
+            'type': 'service',
+            'name': 'service-{0}'.format(i),
+            'group': rng.choice(GROUPS),
+            'checkLocations': sorted(rng.sample([node for node, _ in NODES], 3)),
+            'slowThreshold': 500,
+            'timeout': 10,
+        }
+        if rng.random() < 0.8:
+            service.update(checkType='http', checkMethod='GET',
+                           checkUrl='https://service-{0}.example.com/'.format(i))
+        else:
+            service.update(checkType='tcp', host='service-{0}.example.com'.format(i), port='443',
+                           data={'input': '', 'output': ''})
+        result.append(service)
+    return result
+
+
+def nodes():
+    return [{'id': node, 'name': name} for node, name in NODES]
+
+
+def statuses(service, seed=0):
+    """The latest check of a service from each of its locations"""
+    rng = random.Random('{0}{1}'.format(seed, service['_id']))
+    return [{
+        'location': location,
+        'status': 'up' if rng.random() < 0.95 else 'down',
+        'code': 200,
+        'rtt': round(rng.random() * 0.3, 3),
+        'time': round(rng.random() * 0.8, 3),
+    } for location in service.get('checkLocations', [])]
+
+
+def alerts(n, subjects, seed=0, now=None):
+    """n open alerts on random subjects, a list of devices or services"""
+    rng = random.Random(seed + 2)
+    now = now or time.time()
+    result = []
+    for i in range(n):
+        subject = rng.choice(subjects)
+        (_, group_name), fields = rng.choice(METRICS)
+        _, field_name, unit = rng.choice(fields)
+        result.append({
+            '_id': object_id(rng),
+            'fixed': False,
+            'config': {
+                'subjectId': subject['_id'],
+                'subjectType': subject.get('type', 'device'),
+                'fullName': '{0} > {1}'.format(group_name, field_name),
+                'fullComparison': 'more than',
+                'value': rng.randint(1, 100),
+                'units': unit,
+                'group': subject.get('group') or 'Ungrouped',
+                'lastTriggeredAt': {'sec': int(now - rng.random() * 86400)},
+            }
+        })
+    return result
+
+
+def available():
+    """The metrics definitions every synthetic device has, as returned by
+    the available metrics endpoint"""
+    return [{'key': key, 'name': name, 'tree': [
+        {'key': field_key, 'name': field_name} for field_key, field_name, _ in fields
+    ]} for (key, name), fields in METRICS]
+
+
+def series(filter, start, end, points=None, seed=0):
+    """The metrics endpoint's answer for filter between start and end,
+    unix timestamps. Without points, there's one every minute"""
+    rng = random.Random(seed)
+    start, end = int(start), int(end)
+    points = points or max((end - start) // 60, 1)
+    step = max(float(end - start) / points, 1e-3)
+
+    known = dict((key, (name, fields)) for (key, name), fields in METRICS)
+    tree = []
+    for key in sorted(filter):
+        wanted = filter[key]
+        name, fields = known.get(key, (key, None))
+        if fields is None:
+            # anything else, such as the `time` of service checks by
+            # location, gets whatever fields were asked for
+            fields = [(field, dict(NODES).get(field, field), 's')
+                      for field in (sorted(wanted) if isinstance(wanted, dict) else ['value'])]
+        tree.append({'key': key, 'name': name, 'tree': [{
+            'key': field_key,
+            'name': field_name,
+            'unit': unit,
+            'data': _random_walk(rng, start, step, points),
+        } for field_key, field_name, unit in fields if wanted == 'all' or field_key in wanted]})
+    return tree
+
+
+def _random_walk(rng, start, step, points):
+    value = rng.random() * 100
+    data = []
+    for i in range(points):
+        value = max(value + rng.gauss(0, 2), 0)
+        data.append({'x': int(start + i * step), 'y': round(value, 2)})
+    return data
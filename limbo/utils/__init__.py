@@ -1,5 +1,6 @@
 import sys
 import os
+import threading
 
 PYTHON3 = sys.version_info[0] > 2
 
@@ -30,6 +31,30 @@ def strip_extension(lst):
     return (os.path.splitext(l)[0] for l in lst)
 
 
+def run_concurrently(calls):
+    """Run each of calls, functions that take no arguments, on a thread of
+    its own and return their results in the same order. If any of them
+    raises, the first exception is raised again here once all are done."""
+    results = [None] * len(calls)
+    errors = []
+
+    def run(n, call):
+        try:
+            results[n] = call()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(n, call)) for n, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return results
+
+
 def getif(config, name, envvar):
     if envvar in os.environ:
         config[name] = os.environ.get(envvar)
@@ -3,11 +3,15 @@ from collections import namedtuple
 import logging
 from .mock_handler import MockHandler
 import os
-import sqlite3
 import tempfile
 from nose.tools import eq_
 
 import limbo
+from limbo.context import TenantContext
+from limbo.db import Database
+from limbo.dispatcher import Dispatcher
+from limbo.handlers import CommandRouter
+from limbo.registry import get_registry, read_manifest
 
 # test plugin hooks
 #
@@ -137,7 +141,9 @@ def test_handle_bot_message():
 def test_init_db():
     tf = tempfile.NamedTemporaryFile()
     db = limbo.init_db(tf.name)
-    eq_(type(db), type(sqlite3.connect(":memory:")))
+    eq_(type(db), Database)
+    eq_(list(db.iterquery("PRAGMA journal_mode")), [("wal",)])
+    eq_(limbo.init_db(tf.name), db)
 
 class FakeSlackClient(object):
     def __init__(self, connect=True):
@@ -153,3 +159,92 @@ def test_loop_hook():
     limbo.loop(server, test_loop=1)
 
     eq_(server._loop_plugin_ran, True)
+
+def test_dispatcher_inline():
+    hooks = limbo.init_plugins("test/plugins")
+    sent = []
+    slack = limbo.FakeSlack()
+    slack.rtm_send_message = lambda channel, msg: sent.append((channel, msg))
+    server = limbo.FakeServer(slack=slack, hooks=hooks)
+    dispatcher = Dispatcher(server, workers=0)
+    dispatcher.dispatch({"type": "message", "user": "2", "text": u"!echo hi", "channel": "C1"})
+    eq_(sent, [("C1", u"!echo hi")])
+
+def test_dispatcher_keeps_channel_order():
+    hooks = limbo.init_plugins("test/plugins")
+    sent = []
+    slack = limbo.FakeSlack()
+    slack.rtm_send_message = lambda channel, msg: sent.append((channel, msg))
+    server = limbo.FakeServer(slack=slack, hooks=hooks)
+    dispatcher = Dispatcher(server, workers=3)
+    dispatcher.start()
+    for i in range(20):
+        dispatcher.dispatch({"type": "message", "user": "2", "text": u"!echo {0}".format(i), "channel": "C1"})
+    dispatcher.stop()
+    eq_([msg for _, msg in sent], [u"!echo {0}".format(i) for i in range(20)])
+
+def test_dispatcher_queue_full():
+    server = limbo.FakeServer(hooks={})
+    dispatcher = Dispatcher(server, workers=1, queue_size=1)
+    eq_(dispatcher.dispatch({"type": "message", "channel": "C1"}), True)
+    eq_(dispatcher.dispatch({"type": "message", "channel": "C1"}), False)
+
+def test_registry_is_shared():
+    first = get_registry("test/plugins")
+    second = get_registry("test/plugins")
+    assert first is second
+    assert first.hooks is limbo.init_plugins("test/plugins")
+
+def test_registry_reload():
+    first = get_registry("test/plugins")
+    second = get_registry("test/plugins", reload=True)
+    assert first is not second
+    eq_(len(second.hooks["message"]), 2)
+
+def test_registry_imports_lazily():
+    registry = get_registry("test/plugins", reload=True)
+    eq_(registry.import_times()["echo"], None)
+    server = limbo.FakeServer(hooks=registry.hooks)
+    eq_(limbo.handle_message({"user": "2", "text": u"!echo lazy"}, server), u"!echo lazy")
+    assert registry.plugins["echo"].module is not None
+    assert registry.import_times()["echo"] >= 0
+
+def test_read_manifest():
+    eq_(read_manifest(os.path.join(DIR, "plugins", "init.py")),
+        {"doc": None, "triggers": None, "hooks": ["init", "message"]})
+    eq_(read_manifest(os.path.join(PARENT, "limbo", "plugins", "stats.py"))["triggers"], ["stats"])
+
+def test_read_manifest_needs_literal_triggers():
+    with tempfile.NamedTemporaryFile("w", suffix=".py") as f:
+        f.write("TRIGGERS = list(\"ab\")\ndef on_message(msg, server):\n    pass\n")
+        f.flush()
+        eq_(read_manifest(f.name), None)
+
+def test_tenant_context():
+    context = TenantContext({"resourceID": "abc"})
+    eq_(context.resource_id, "abc")
+    first = context.get("thing", list)
+    first.append(1)
+    eq_(context.get("thing", list), [1])
+
+def test_router():
+    router = CommandRouter()
+    graph = lambda msg, server: "graph"
+    chatter = lambda msg, server: "chatter"
+    router.add(graph, ["graph"])
+    router.add(chatter)
+    eq_(router.route(u"sdbot graph cpu for web1"), [graph, chatter])
+    eq_(router.route(u"SDBot graph"), [graph, chatter])
+    eq_(router.route(u"sdbot devices list"), [chatter])
+    eq_(router.route(u"hello there"), [chatter])
+
+def test_handle_message_routed():
+    server = limbo.FakeServer(hooks={"router": CommandRouter()})
+    server.hooks["router"].add(lambda msg, server: "graphed", ["graph"])
+    eq_(limbo.handle_message({"user": "2", "text": u"sdbot graph cpu"}, server), "graphed")
+    eq_(limbo.handle_message({"user": "2", "text": u"graph cpu"}, server), "")
+
+def test_fake_server_web():
+    server = limbo.FakeServer()
+    server.web.post_message("C1", "hello", attachments="[]")
+    eq_(server.web.posted_messages, [("C1", "hello", {"attachments": "[]"})])
@@ -0,0 +1,62 @@
+# -*- coding: UTF-8 -*-
+import argparse
+import json
+import tempfile
+
+from nose.tools import eq_
+
+from limbo import bench, synthetic
+
+
+def test_regressions():
+    baseline = {"a": {"seconds": 1.0}, "b": {"seconds": 1.0}}
+    results = {"a": {"seconds": 1.2}, "b": {"seconds": 1.5}, "c": {"seconds": 9.0}}
+    eq_(bench.regressions(results, baseline, 0.25), [("b", 1.0, 1.5)])
+    eq_(bench.regressions(results, baseline, 0), [("a", 1.0, 1.2), ("b", 1.0, 1.5)])
+
+def test_regressions_missing():
+    baseline = {"a": {"seconds": 1.0}, "b": {"seconds": 1.0}}
+    eq_(bench.regressions({"a": {"seconds": 1.0}}, baseline), [("b", 1.0, None)])
+
+def run_main(baseline, threshold):
+    with tempfile.NamedTemporaryFile("w", suffix=".json") as f:
+        json.dump({"results": baseline}, f)
+        f.flush()
+        args = argparse.Namespace(bench_filter="metric_filter", bench_output=None,
+                                  bench_baseline=f.name, bench_threshold=threshold)
+        return bench.main(args)
+
+def test_main_compares_to_baseline():
+    slow = dict(("metric_filter[{0}]".format(size), {"name": "metric_filter", "seconds": 60.0})
+                for size in (1, 3, 6))
+    # another benchmark left out by the filter isn't missing
+    slow["clean_parsing"] = {"name": "clean_parsing", "seconds": 60.0}
+    eq_(run_main(slow, 0), 0)
+    fast = dict((key, dict(before, seconds=1e-12)) for key, before in slow.items())
+    # 0 is a threshold, not the default
+    eq_(run_main(fast, 0), 1)
+    slow["metric_filter[99]"] = {"name": "metric_filter", "seconds": 60.0}
+    eq_(run_main(slow, 0), 1)
+
+def test_measure():
+    calls = []
+    seconds, number = bench.measure(lambda: calls.append(1), repeat=2, min_time=0.001)
+    eq_(len(calls), 1 + 2 * number)
+    assert seconds >= 0
+
+def test_run():
+    results = bench.run("metric_filter", repeat=1, min_time=0.001)
+    eq_(sorted(results), ["metric_filter[1]", "metric_filter[3]", "metric_filter[6]"])
+
+def test_synthetic_account():
+    devices = synthetic.devices(100)
+    eq_(len(set(device["_id"] for device in devices)), 100)
+    eq_(devices, synthetic.devices(100))
+    alerts = synthetic.alerts(10, devices)
+    assert all(alert["config"]["subjectId"] in [d["_id"] for d in devices] for alert in alerts)
+
+def test_synthetic_series():
+    series = synthetic.series({"memory": {"memSwapFree": "all"}}, 0, 3600)
+    eq_([node["key"] for node in series], ["memory"])
+    eq_([node["key"] for node in series[0]["tree"]], ["memSwapFree"])
+    eq_(len(series[0]["tree"][0]["data"]), 60)
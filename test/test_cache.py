@@ -0,0 +1,39 @@
+# -*- coding: UTF-8 -*-
+from nose.tools import eq_
+
+from limbo.utils.cache import TTLCache
+
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+def test_get_set():
+    cache = TTLCache()
+    cache.set("a", 1)
+    eq_(cache.get("a"), 1)
+    eq_(cache.get("b"), None)
+    eq_(cache.get("b", 2), 2)
+
+def test_expires():
+    timer = FakeTimer()
+    cache = TTLCache(ttl=10, timer=timer)
+    cache.set("a", 1)
+    timer.now = 9
+    eq_(cache.get("a"), 1)
+    timer.now = 10
+    eq_(cache.get("a"), None)
+    eq_(len(cache), 0)
+
+def test_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    eq_(cache.get("a"), 1)
+    eq_(cache.get("b"), None)
+    eq_(cache.get("c"), 3)
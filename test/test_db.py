@@ -0,0 +1,149 @@
+# -*- coding: UTF-8 -*-
+import sqlite3
+import tempfile
+import threading
+
+from nose.tools import eq_
+
+from limbo.db import Database, is_read
+
+
+def make_db(**kwargs):
+    tf = tempfile.NamedTemporaryFile()
+    db = Database(tf.name, **kwargs)
+    # keep the file around as long as the database
+    db.tempfile = tf
+    db.query("CREATE TABLE kv (k TEXT PRIMARY KEY, v INTEGER)")
+    return db
+
+def test_is_read():
+    assert is_read("SELECT * FROM kv")
+    assert is_read("  with x as (select 1) select * from x")
+    assert not is_read("INSERT INTO kv VALUES ('a', 1)")
+    assert not is_read("WITH old AS (SELECT k FROM kv WHERE v < 0) DELETE FROM kv WHERE k IN old")
+    assert not is_read("with x(k) as (values ('select')) insert into kv select k, 1 from x")
+    assert not is_read("")
+
+def test_reads_see_queued_writes():
+    db = make_db()
+    db.execute("INSERT INTO kv VALUES (?, ?)", "a", 1)
+    db.executemany("INSERT INTO kv VALUES (?, ?)", [("b", 2), ("c", 3)])
+    eq_(db.query("SELECT k, v FROM kv ORDER BY k"), [("a", 1), ("b", 2), ("c", 3)])
+    db.close()
+
+def test_reads_do_not_wait_for_other_threads_writes():
+    db = make_db()
+    # hold the write lock so this thread's write stays queued
+    lock = sqlite3.connect(db.path, isolation_level=None)
+    lock.execute("BEGIN IMMEDIATE")
+    db.execute("INSERT INTO kv VALUES (?, ?)", "a", 1)
+    rows = []
+    reader = threading.Thread(target=lambda: rows.extend(db.query("SELECT count(*) FROM kv")))
+    reader.start()
+    reader.join(5)
+    lock.execute("COMMIT")
+    eq_(rows, [(0,)])
+    eq_(db.query("SELECT count(*) FROM kv"), [(1,)])
+    db.close()
+
+def test_iterquery_streams_rows():
+    db = make_db()
+    db.executemany("INSERT INTO kv VALUES (?, ?)", (("k{0}".format(n), n) for n in range(1000)))
+    rows = db.iterquery("SELECT v FROM kv ORDER BY v")
+    eq_(next(rows), (0,))
+    eq_(sum(v for v, in rows), sum(range(1, 1000)))
+    db.close()
+
+def test_failed_write_does_not_lose_batch():
+    db = make_db()
+    db.execute("INSERT INTO kv VALUES (?, ?)", "a", 1)
+    db.execute("INSERT INTO nope VALUES (?)", 1)
+    db.execute("INSERT INTO kv VALUES (?, ?)", "b", 2)
+    eq_(db.query("SELECT count(*) FROM kv"), [(2,)])
+    db.close()
+
+def test_writes_from_many_threads():
+    db = make_db()
+
+    def write(n):
+        for m in range(50):
+            db.execute("INSERT INTO kv VALUES (?, ?)", "{0}-{1}".format(n, m), m)
+        # reads only wait for their own thread's writes
+        db.flush()
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    eq_(db.query("SELECT count(*) FROM kv"), [(400,)])
+    db.close()
+
+def test_reads_do_not_write():
+    db = make_db()
+    try:
+        list(db.iterquery("DELETE FROM kv"))
+    except sqlite3.OperationalError:
+        pass
+    else:
+        raise AssertionError("a read connection ran a write")
+    db.close()
+
+def raises(exception, func, *args):
+    try:
+        func(*args)
+    except exception:
+        return
+    raise AssertionError("{0} not raised".format(exception.__name__))
+
+def test_query_raises_failed_write():
+    db = make_db()
+    raises(sqlite3.OperationalError, db.query, "INSERT INTO nope VALUES (1)")
+    db.query("INSERT INTO kv VALUES ('a', 1)")
+    raises(sqlite3.IntegrityError, db.query, "INSERT INTO kv VALUES ('a', 2)")
+    eq_(db.query("SELECT k, v FROM kv"), [("a", 1)])
+    db.close()
+
+def test_flush_raises_failed_write_of_its_thread():
+    db = make_db()
+    db.execute("INSERT INTO nope VALUES (?)", 1)
+    other = threading.Thread(target=db.flush)
+    other.start()
+    other.join()
+    raises(sqlite3.OperationalError, db.flush)
+    # only raised once
+    db.flush()
+    db.close()
+
+def test_pragma_returns_rows():
+    db = make_db()
+    db.execute("INSERT INTO kv VALUES (?, ?)", "a", 1)
+    eq_([row[1] for row in db.query("PRAGMA table_info(kv)")], ["k", "v"])
+    eq_(db.query("PRAGMA journal_mode"), [("wal",)])
+    eq_(db.query("SELECT count(*) FROM kv"), [(1,)])
+    db.close()
+
+def test_own_transactions_are_refused():
+    db = make_db()
+    raises(ValueError, db.query, "BEGIN")
+    raises(ValueError, db.execute, "commit")
+    db.close()
+
+def test_executeall_keeps_all_or_nothing():
+    db = make_db()
+    db.executeall([("INSERT INTO kv VALUES (?, ?)", ("a", 1)),
+                   ("UPDATE kv SET v = v + 1 WHERE k = ?", ("a",))])
+    db.executeall([("INSERT INTO kv VALUES (?, ?)", ("b", 1)),
+                   ("INSERT INTO kv VALUES (?, ?)", ("a", 1))])
+    raises(sqlite3.IntegrityError, db.flush)
+    eq_(db.query("SELECT k, v FROM kv"), [("a", 2)])
+    db.close()
+
+def test_executemany_keeps_all_or_nothing():
+    db = make_db()
+    db.execute("INSERT INTO kv VALUES (?, ?)", "a", 1)
+    db.executemany("INSERT INTO kv VALUES (?, ?)", [("b", 2), ("a", 3)])
+    db.execute("INSERT INTO kv VALUES (?, ?)", "c", 4)
+    raises(sqlite3.IntegrityError, db.flush)
+    eq_(db.query("SELECT k, v FROM kv ORDER BY k"), [("a", 1), ("c", 4)])
+    db.close()
@@ -0,0 +1,74 @@
+# -*- coding: UTF-8 -*-
+import json
+import time
+
+try:
+    from urllib.error import HTTPError
+    from urllib.parse import quote
+    from urllib.request import urlopen
+except ImportError:
+    from urllib import quote
+    from urllib2 import HTTPError, urlopen
+
+from nose.tools import eq_
+
+from limbo.fakeapi import Account, serve
+from limbo.plugins.common.clients import ClientRegistry
+
+
+def get(server, path):
+    host, port = server.server_address[:2]
+    try:
+        response = urlopen("http://{0}:{1}{2}".format(host, port, path))
+        return response.getcode(), json.loads(response.read().decode("utf8"))
+    except HTTPError as e:
+        return e.code, json.loads(e.read().decode("utf8"))
+
+def test_inventory():
+    account = Account(devices=5, services=2, alerts=3)
+    server = serve(account, port=0)
+    status, devices = get(server, "/inventory/devices?token=x")
+    eq_(status, 200)
+    eq_([device["name"] for device in devices], ["device-{0}".format(n) for n in range(5)])
+    _id = devices[2]["_id"]
+    eq_(get(server, "/inventory/devices/" + _id)[1]["name"], "device-2")
+    eq_(get(server, "/inventory/devices/nope")[0], 404)
+    eq_(len(get(server, "/alerts/triggered")[1]), 3)
+    filter = quote(json.dumps({"name": {"$regex": "^service-1$"}}))
+    eq_([item["name"] for item in get(server, "/inventory/resources?filter=" + filter)[1]], ["service-1"])
+    server.shutdown()
+
+def test_graphs():
+    server = serve(Account(devices=1, points=10), port=0)
+    filter = quote(json.dumps({"memory": {"memSwapFree": "all"}}))
+    status, series = get(server, "/metrics/graphs/abc?start=2016-01-01T10:00:00"
+                                 "&end=2016-01-01T12:00:00&filter=" + filter)
+    eq_(status, 200)
+    eq_(series[0]["tree"][0]["key"], "memSwapFree")
+    eq_(len(series[0]["tree"][0]["data"]), 10)
+    eq_(get(server, "/metrics/graphs/abc")[0], 400)
+    server.shutdown()
+
+def test_errors_and_latency():
+    server = serve(Account(devices=1), port=0, latency=0.05, error_rate=1.0)
+    start = time.time()
+    status, body = get(server, "/inventory/devices")
+    assert time.time() - start >= 0.05
+    eq_(status, 500)
+    server.shutdown()
+
+def test_unknown_endpoint():
+    server = serve(Account(devices=1), port=0)
+    eq_(get(server, "/nope")[0], 404)
+    server.shutdown()
+
+def test_services_through_wrapper():
+    # the wrapper validates what it gets against its own schema
+    server = serve(Account(devices=1, services=20), port=0)
+    api = ClientRegistry("x", base_url="http://127.0.0.1:{0}".format(server.server_port)).api()
+    services = api.services.list()
+    eq_([service["name"] for service in services], ["service-{0}".format(n) for n in range(20)])
+    eq_(set(service["checkType"] for service in services), set(["http", "tcp"]))
+    tcp = [service for service in services if service["checkType"] == "tcp"][0]
+    eq_(api.services.view(tcp["_id"])["port"], "443")
+    server.shutdown()
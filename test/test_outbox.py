@@ -0,0 +1,112 @@
+# -*- coding: UTF-8 -*-
+import io
+import threading
+import time
+
+from nose.tools import eq_
+
+from limbo.fakeserver import FakeSlack, FakeSlackWeb
+from limbo.outbox import Outbox
+from limbo.slackweb import SlackRateLimited
+
+
+def make_outbox(web=None, **kwargs):
+    slack = FakeSlack()
+    slack.sent = []
+    slack.rtm_send_message = lambda channel, text: slack.sent.append((channel, text))
+    return Outbox(web or FakeSlackWeb(), slack, **kwargs)
+
+def test_inline_until_started():
+    outbox = make_outbox()
+    outbox.send("C1", "hi")
+    outbox.post_message("C1", "there", as_user="bot")
+    eq_(outbox.slack.sent, [("C1", "hi")])
+    eq_(outbox.web.posted_messages, [("C1", "there", {"as_user": "bot"})])
+
+def test_coalesces_text_replies():
+    outbox = make_outbox(interval=0.2)
+    outbox.start()
+    for text in ("a", "b", "c"):
+        outbox.send("C1", text)
+    outbox.stop()
+    assert len(outbox.slack.sent) < 3
+    eq_("\n".join(text for _, text in outbox.slack.sent), "a\nb\nc")
+
+def test_does_not_coalesce_attachments():
+    outbox = make_outbox(interval=0.2)
+    outbox.start()
+    outbox.post_message("C1", "", attachments=[{"text": "a"}])
+    outbox.post_message("C1", "", attachments=[{"text": "b"}])
+    outbox.stop()
+    eq_(len(outbox.web.posted_messages), 2)
+
+def test_channels_are_paced_separately():
+    outbox = make_outbox(interval=0.2)
+    outbox.start()
+    outbox.post_message("C1", "", attachments=[{"text": "a"}])
+    outbox.post_message("C1", "", attachments=[{"text": "b"}])
+    outbox.post_message("C2", "c")
+    # C2 doesn't wait for C1's interval
+    time.sleep(0.1)
+    outbox.stop()
+    eq_([channel for channel, _, _ in outbox.web.posted_messages], ["C1", "C2", "C1"])
+
+class LimitedWeb(FakeSlackWeb):
+    def __init__(self, limited):
+        super(LimitedWeb, self).__init__()
+        self.limited = limited
+
+    def post_message(self, channel, message, **kwargs):
+        if self.limited:
+            self.limited -= 1
+            raise SlackRateLimited("chat.postMessage", 0.01)
+        return super(LimitedWeb, self).post_message(channel, message, **kwargs)
+
+def test_retries_rate_limited():
+    outbox = make_outbox(LimitedWeb(2))
+    outbox.start()
+    outbox.post_message("C1", "hi")
+    outbox.stop()
+    eq_(outbox.web.posted_messages, [("C1", "hi", {})])
+
+def test_gives_up_after_retries():
+    outbox = make_outbox(LimitedWeb(5), max_retries=1)
+    outbox.post_message("C1", "hi")
+    eq_(outbox.web.posted_messages, [])
+
+def test_upload_returns_response():
+    outbox = make_outbox(interval=0.05)
+    outbox.start()
+    response = outbox.upload(io.BytesIO(b"png"), "web1.png", "C1")
+    outbox.stop()
+    eq_(response["file"]["permalink"], "https://files.example/web1.png")
+    eq_(outbox.web.uploads, [(b"png", "web1.png", "C1")])
+
+class SlowUploadWeb(FakeSlackWeb):
+    def __init__(self):
+        super(SlowUploadWeb, self).__init__()
+        self.uploading = threading.Event()
+        self.release = threading.Event()
+
+    def upload(self, fileobj, filename, channels, **kwargs):
+        self.uploading.set()
+        self.release.wait(5)
+        return super(SlowUploadWeb, self).upload(fileobj, filename, channels, **kwargs)
+
+def test_upload_does_not_block_other_channels():
+    outbox = make_outbox(SlowUploadWeb(), interval=0.05)
+    outbox.start()
+    uploader = threading.Thread(target=outbox.upload, args=(io.BytesIO(b"png"), "web1.png", "C1"))
+    uploader.start()
+    outbox.web.uploading.wait(5)
+    outbox.post_message("C2", "hi")
+    for _ in range(50):
+        if outbox.web.posted_messages:
+            break
+        time.sleep(0.01)
+    eq_(outbox.web.posted_messages, [("C2", "hi", {})])
+    eq_(outbox.web.uploads, [])
+    outbox.web.release.set()
+    uploader.join()
+    outbox.stop()
+    eq_(outbox.web.uploads, [(b"png", "web1.png", "C1")])
@@ -0,0 +1,58 @@
+# -*- coding: UTF-8 -*-
+from nose.tools import eq_
+
+from limbo.fakeclients import FakeApi, FakeClients, fake_server
+from limbo.plugins import devices
+from limbo.plugins.common.catalog import MetricTrie
+
+DEFINITIONS = [
+    {"key": "cpuStats", "tree": [
+        {"key": "CPUs", "tree": [
+            {"key": "usr"},
+            {"key": "sys"},
+        ]},
+    ]},
+    {"key": "memory", "tree": [
+        {"key": "memSwapFree"},
+        {"key": "memPhysUsed"},
+    ]},
+]
+
+def test_paths():
+    trie = MetricTrie(DEFINITIONS)
+    eq_(list(trie.paths()), [["cpuStats", "CPUs", "usr"],
+                             ["cpuStats", "CPUs", "sys"],
+                             ["memory", "memSwapFree"],
+                             ["memory", "memPhysUsed"]])
+
+def test_contains():
+    trie = MetricTrie(DEFINITIONS)
+    assert trie.contains(["cpuStats", "CPUs", "usr"])
+    assert trie.contains(["cpuStats", "CPUs"])
+    assert not trie.contains(["cpuStats", "CPU", "usr"])
+
+def test_complete():
+    trie = MetricTrie(DEFINITIONS)
+    eq_(trie.complete(["memory", "memS"]), [["memory", "memSwapFree"]])
+    eq_(trie.complete(["cpuStats", "cpus", "usr"]), [["cpuStats", "CPUs", "usr"],
+                                                     ["cpuStats", "CPUs", "sys"]])
+    eq_(len(trie.complete(["nothing"], limit=3)), 0)
+
+def test_empty():
+    eq_(len(MetricTrie()), 0)
+
+def offline_device_wrapper(module):
+    api = FakeApi(devices=1, alerts=0)
+    api.metrics.available = lambda _id, start, end: []
+    return module.Wrapper({"channel": "C1"}, fake_server(clients=FakeClients(api)))
+
+def test_available_without_metrics():
+    wrapper = offline_device_wrapper(devices)
+    text = wrapper.get_available("device-0")
+    eq_(text, wrapper.no_metrics("device-0"))
+    assert "``" not in text
+
+def test_no_metric_named():
+    wrapper = offline_device_wrapper(devices)
+    _id = wrapper.inventory.find_id("device-0", ["devices"])
+    assert "``" not in wrapper.unknown_metric(_id, " ", "device-0")
@@ -0,0 +1,72 @@
+# -*- coding: UTF-8 -*-
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from nose.tools import eq_
+import numpy as np
+
+from limbo.plugins.common import graphpool
+from limbo.plugins.common.graphpool import downsample, to_datetimes
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT = os.path.dirname(os.path.dirname(DIR))
+
+def test_downsample_short_series():
+    x = np.arange(10, dtype=float)
+    y = np.arange(10, dtype=float)
+    dx, dy = downsample(x, y, 400)
+    eq_(len(dx), 10)
+
+def test_downsample_keeps_extremes():
+    x = np.arange(50000, dtype=float)
+    y = np.sin(x / 100)
+    y[12345] = 50
+    y[23456] = -50
+    dx, dy = downsample(x, y, 400)
+    assert len(dx) <= 802
+    eq_(dy.max(), 50)
+    eq_(dy.min(), -50)
+    eq_(dx[0], 0)
+    eq_(dx[-1], 49999)
+    assert np.all(np.diff(dx) > 0)
+
+def test_to_datetimes():
+    x = np.array([1450000000.0, 1450000060.0])
+    eq_(list(to_datetimes(x)), [datetime.fromtimestamp(t) for t in x])
+
+def test_to_datetimes_across_dst():
+    old = os.environ.get('TZ')
+    os.environ['TZ'] = 'Europe/London'
+    time.tzset()
+    try:
+        # every 10 minutes from a day before to a day after the clocks went
+        # forward on 27 March 2016
+        x = np.arange(1458950400.0, 1459123200.0, 600)
+        eq_(list(to_datetimes(x)), [datetime.fromtimestamp(t) for t in x])
+    finally:
+        if old is None:
+            del os.environ['TZ']
+        else:
+            os.environ['TZ'] = old
+        time.tzset()
+
+def test_pool_is_not_forked_from_the_bot():
+    if hasattr(multiprocessing, 'get_context'):
+        assert graphpool._context().get_start_method() in ('forkserver', 'spawn')
+
+def test_render_through_pool():
+    # in a fresh interpreter, so the workers don't import the test runner
+    code = ("import sys\n"
+            "from limbo.plugins.common.graphpool import render_graph\n"
+            "png = render_graph([0, 60, 120, 180], [1, 3, 2, 4], '%', 180)\n"
+            "sys.stdout.write(str(png[1:4].decode('ascii')))\n")
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([PARENT] + sys.path)
+    proc = subprocess.Popen([sys.executable, '-c', code], cwd=PARENT, env=env, stdout=subprocess.PIPE)
+    out = proc.communicate()[0].decode('ascii')
+    eq_(proc.returncode, 0)
+    eq_(out, 'PNG')
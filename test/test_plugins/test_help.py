@@ -1,4 +1,5 @@
 # -*- coding: UTF-8 -*-
+import json
 import os
 import sys
 
@@ -9,27 +10,44 @@ sys.path.insert(0, os.path.join(DIR, '../../limbo/plugins'))
 
 from help import on_message
 import limbo
+from limbo.registry import HelpPayloads, get_registry
+
+HELP = {
+    "test": {"title": "test", "text": "!test help system"},
+    "other": {"title": "another", "text": "!other help"},
+}
+
+def posted(server):
+    eq_(len(server.web.posted_messages), 1)
+    _, _, kwargs = server.web.posted_messages[0]
+    return kwargs["text"], json.loads(kwargs["attachments"])
 
 def test_basic():
-    hooks = {"help": {"test": "!test help system"}}
+    hooks = {"help": HELP, "help_payloads": HelpPayloads(HELP)}
     server = limbo.FakeServer(hooks=hooks)
-    ret = on_message({"text": u"!help"}, server)
-    eq_(ret, hooks["help"]["test"])
+    on_message({"text": u"sdbot help", "channel": "C1"}, server)
+    eq_(posted(server), ("I know lots of commands, try one out!", [HELP["other"], HELP["test"]]))
 
 def test_nonexistent():
-    hooks = {}
-    server = limbo.FakeServer(hooks=hooks)
-    ret = on_message({"text": u"!help"}, server)
-    eq_(ret, '')
+    server = limbo.FakeServer(hooks={})
+    on_message({"text": u"sdbot", "channel": "C1"}, server)
+    eq_(posted(server), ("I know lots of commands, try one out!", []))
 
 def test_extended():
-    hooks = {"extendedhelp": {"test": "!test help system\nline 2"}}
+    hooks = {"help_payloads": HelpPayloads(HELP, {"testing": "test"})}
     server = limbo.FakeServer(hooks=hooks)
-    ret = on_message({"text": u"!help test"}, server)
-    eq_(ret, hooks["extendedhelp"]["test"])
+    on_message({"text": u"sdbot help testing", "channel": "C1"}, server)
+    eq_(posted(server), ("", [HELP["test"]]))
 
 def test_extended_not_there():
-    hooks = {"extendedhelp": {"test": "!test help system\nline 2"}}
+    hooks = {"help_payloads": HelpPayloads(HELP)}
     server = limbo.FakeServer(hooks=hooks)
-    ret = on_message({"text": u"!help not_there"}, server)
+    ret = on_message({"text": u"sdbot help not_there", "channel": "C1"}, server)
     eq_(ret, 'No help found for not_there')
+
+def test_registry_payloads():
+    registry = get_registry()
+    payloads = registry.hooks["help_payloads"]
+    eq_(json.loads(payloads.topic("devices")), [registry.hooks["help"]["devices"]])
+    eq_(payloads.topic("device"), payloads.topic("devices"))
+    assert get_registry().hooks["help_payloads"] is payloads
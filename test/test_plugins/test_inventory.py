@@ -0,0 +1,64 @@
+# -*- coding: UTF-8 -*-
+from nose.tools import eq_
+
+from limbo.plugins.common.inventory import Inventory, InventoryIndex
+
+
+class FakeInventory(Inventory):
+    def __init__(self, *args, **kwargs):
+        super(FakeInventory, self).__init__(None, *args, **kwargs)
+        self.fetches = []
+
+    def _fetch(self, kind):
+        self.fetches.append(kind)
+        return [{"_id": str(len(self.fetches)), "name": kind}]
+
+    def _refresh_in_background(self, kind):
+        # refresh synchronously so the test can see it
+        self.refresh(kind)
+
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+def test_fetches_once():
+    inventory = FakeInventory()
+    first = inventory.devices()
+    eq_(inventory.devices(), first)
+    eq_(inventory.fetches, ["devices"])
+
+def test_serves_stale_while_refreshing():
+    timer = FakeTimer()
+    inventory = FakeInventory(ttl=10, max_age=100, timer=timer)
+    first = inventory.services()
+    timer.now = 11
+    eq_(inventory.services(), first)
+    eq_(inventory.fetches, ["services", "services"])
+    assert inventory.services() != first
+
+def test_too_old_refetches():
+    timer = FakeTimer()
+    inventory = FakeInventory(ttl=10, max_age=100, timer=timer)
+    first = inventory.devices()
+    timer.now = 101
+    assert inventory.devices() != first
+
+def test_index_lookups():
+    index = InventoryIndex([{"_id": "a", "name": "web1"},
+                            {"_id": "b", "name": "web2"},
+                            {"_id": "c", "name": "web1"}])
+    eq_(index.ids["web1"], "a")
+    eq_(index.names["b"], "web2")
+
+def test_find_id_and_name():
+    inventory = FakeInventory()
+    # services are looked at first, so they're downloaded first
+    eq_(inventory.find_id("devices"), "2")
+    eq_(inventory.find_id("services"), "1")
+    eq_(inventory.find_id("services", ["devices"]), None)
+    eq_(inventory.find_name("1"), "services")
+    eq_(inventory.find_name("nope"), "No name")
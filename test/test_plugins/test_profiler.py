@@ -0,0 +1,69 @@
+# -*- coding: UTF-8 -*-
+import os
+import sys
+import threading
+
+from nose.tools import eq_
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR, '../../limbo/plugins'))
+
+from profiler import on_message
+import limbo
+from limbo import profiling
+
+def ping(msg, server):
+    if msg["text"] == u"sdbot ping":
+        return u"pong"
+
+def make_server(admins):
+    return limbo.FakeServer(config={"admins": admins}, hooks={"message": [ping]})
+
+def test_admin_by_name():
+    # user 2 of the fake slack is msguser
+    ret = on_message({"text": u"sdbot profile ping", "user": "2"}, make_server("msguser"))
+    lines = ret.splitlines()
+    eq_(lines[0], u"pong")
+    assert u"cumtime" in lines[1]
+    assert u"ping" in ret
+
+def test_memory():
+    ret = on_message({"text": u"sdbot profile --memory ping", "user": "2"}, make_server("2"))
+    eq_(ret.splitlines()[0], u"pong")
+    if sys.version_info[0] > 2:
+        assert u"allocated" in ret
+
+def test_not_admin():
+    ret = on_message({"text": u"sdbot profile ping", "user": "2"}, make_server("U123"))
+    eq_(ret, u"Sorry, only admins can profile commands")
+
+def test_no_admins():
+    server = limbo.FakeServer(hooks={"message": [ping]})
+    ret = on_message({"text": u"sdbot profile ping", "user": "2"}, server)
+    eq_(ret, u"Sorry, only admins can profile commands")
+
+def test_one_memory_profile_at_a_time():
+    if profiling.tracemalloc is None:
+        return
+    started = threading.Event()
+    finish = threading.Event()
+
+    def slow(msg, server):
+        if msg["text"] == u"sdbot slow":
+            started.set()
+            finish.wait(10)
+            return u"done"
+
+    server = limbo.FakeServer(config={"admins": "2"}, hooks={"message": [ping, slow]})
+    replies = []
+    thread = threading.Thread(target=lambda: replies.append(
+        on_message({"text": u"sdbot profile --memory slow", "user": "2"}, server)))
+    thread.start()
+    started.wait(10)
+    ret = on_message({"text": u"sdbot profile --memory ping", "user": "2"}, server)
+    finish.set()
+    thread.join()
+    eq_(ret, u"Someone is already profiling memory, try again when they're done")
+    eq_(replies[0].splitlines()[0], u"done")
+    # and the next one runs
+    eq_(on_message({"text": u"sdbot profile --memory ping", "user": "2"}, server).splitlines()[0], u"pong")
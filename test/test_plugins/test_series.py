@@ -0,0 +1,109 @@
+# -*- coding: UTF-8 -*-
+import tempfile
+import time
+
+from nose.tools import eq_
+
+from limbo.db import Database
+from limbo.fakeserver import FakeServer
+from limbo.plugins.common.series import (MemorySeriesStore,
+                                         SqliteSeriesStore,
+                                         gap_window,
+                                         merge_range,
+                                         missing_ranges,
+                                         oldest_kept,
+                                         series_key)
+
+# well before the settle window, so every fetch counts as covered
+T = 1000000
+
+def points(start, end, step=60):
+    return [{'x': x, 'y': x - T} for x in range(start, end + 1, step)]
+
+def test_missing_ranges():
+    eq_(missing_ranges([], T, T + 100), [(T, T + 100)])
+    eq_(missing_ranges([(T, T + 100)], T + 10, T + 90), [])
+    eq_(missing_ranges([(T + 20, T + 40), (T + 60, T + 80)], T, T + 100),
+        [(T, T + 20), (T + 40, T + 60), (T + 80, T + 100)])
+
+def test_merge_range():
+    eq_(merge_range([(T, T + 10)], T + 5, T + 20), [(T, T + 20)])
+    eq_(merge_range([(T, T + 10)], T + 30, T + 40), [(T, T + 10), (T + 30, T + 40)])
+    eq_(merge_range([(T, T + 10), (T + 30, T + 40)], T + 10, T + 30), [(T, T + 40)])
+
+def test_series_key():
+    # windows of similar length share a series, much longer ones don't
+    eq_(series_key('a', 'cpu', T, T + 7200), series_key('a', 'cpu', T + 60, T + 7000))
+    assert series_key('a', 'cpu', T, T + 7200) != series_key('a', 'cpu', T, T + 7 * 86400)
+
+def check_store(store):
+    key = series_key('a', 'memory.memSwapFree', T, T + 3600)
+    eq_(store.read(key, T, T + 3600), (None, []))
+    eq_(store.missing(key, T, T + 3600), [(T, T + 3600)])
+
+    store.add(key, T, T + 1800, {'names': ['memory']}, points(T, T + 1800))
+    eq_(store.missing(key, T, T + 3600), [(T + 1800, T + 3600)])
+    store.add(key, T + 1800, T + 3600, None, points(T + 1800, T + 3600))
+    eq_(store.missing(key, T, T + 3600), [])
+
+    meta, data = store.read(key, T + 600, T + 1200)
+    eq_(meta, {'names': ['memory']})
+    eq_(data, points(T + 600, T + 1200))
+
+def test_memory_store():
+    check_store(MemorySeriesStore())
+
+def test_sqlite_store():
+    tf = tempfile.NamedTemporaryFile()
+    server = FakeServer(db=Database(tf.name))
+    check_store(SqliteSeriesStore(server))
+
+def test_recent_points_not_covered():
+    store = MemorySeriesStore(settle=300)
+    now = int(time.time())
+    key = series_key('a', 'cpu', now - 3600, now)
+    store.add(key, now - 3600, now, None, points(now - 3600, now))
+    eq_(len(store.missing(key, now - 3600, now)), 1)
+    gap_start, gap_end = store.missing(key, now - 3600, now)[0]
+    assert now - 301 <= gap_start <= now - 299
+    eq_(gap_end, now)
+
+def test_gap_window():
+    # an hour or less is always the finest resolution
+    eq_(gap_window(T + 3000, T + 3600, T, T + 3600), (T + 3000, T + 3600))
+    # a short gap of a week long window is fetched as a longer one, so its
+    # points are as coarse as the rest
+    week = 7 * 86400
+    gap_start, gap_end = gap_window(T + week - 300, T + week, T, T + week)
+    eq_(gap_end, T + week)
+    eq_(series_key('a', 'cpu', gap_start, gap_end), series_key('a', 'cpu', T, T + week))
+
+def test_oldest_kept():
+    now = T + 86400
+    eq_(oldest_kept(now - 3600, now, now), now - 7200)
+    # a window from long ago keeps its own points
+    eq_(oldest_kept(T, T + 3600, now), T)
+
+def check_pruned(store):
+    key = series_key('a', 'cpu', T, T + 3600)
+    store.add(key, T, T + 3600, {'names': ['cpu']}, points(T, T + 3600))
+    store.add(key, T + 3600, T + 7200, None, points(T + 3600, T + 7200), oldest=T + 3600)
+    eq_(store.read(key, T, T + 7200)[1], points(T + 3600, T + 7200))
+    eq_(store.missing(key, T, T + 7200), [(T, T + 3600)])
+
+def test_memory_store_prunes():
+    check_pruned(MemorySeriesStore())
+
+def test_sqlite_store_prunes():
+    tf = tempfile.NamedTemporaryFile()
+    server = FakeServer(db=Database(tf.name))
+    check_pruned(SqliteSeriesStore(server))
+
+def test_sqlite_ranges_merge_in_one_write():
+    tf = tempfile.NamedTemporaryFile()
+    server = FakeServer(db=Database(tf.name))
+    store = SqliteSeriesStore(server)
+    key = series_key('a', 'cpu', T, T + 3600)
+    for n in range(6):
+        store.add(key, T + n * 600, T + (n + 1) * 600, None, [])
+    eq_(server.query("SELECT start, end FROM series_ranges WHERE key = ?", key), [(T, T + 3600)])
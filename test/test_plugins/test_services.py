@@ -0,0 +1,108 @@
+# -*- coding: UTF-8 -*-
+import threading
+from datetime import datetime, timedelta
+
+from nose.tools import eq_
+
+from limbo.fakeclients import FakeApi, FakeClients, Listing, fake_server
+from limbo.plugins.services import Wrapper
+
+SERVICES = [{"_id": "s1", "name": "web", "checkLocations": ["lon", "nyc", "sfo"]}]
+
+
+def node(location):
+    return {"key": location, "name": location.upper(), "data": [{"x": 0, "y": 0.5}]}
+
+
+class FakeMetrics(object):
+    def __init__(self, left_out=()):
+        # locations the combined request doesn't answer for
+        self.left_out = left_out
+        self.filters = []
+
+    def get(self, _id, start, end, filter):
+        self.filters.append(filter)
+        locations = sorted(filter["time"])
+        if len(locations) > 1:
+            locations = [location for location in locations if location not in self.left_out]
+        return [{"key": "time", "tree": [node(location) for location in locations]}]
+
+
+class FakeStatus(object):
+    """Answers only once the nodes are being fetched too, so it can tell
+    whether the two ran at the same time"""
+    def __init__(self, session):
+        self.session = session
+        self.started = threading.Event()
+        self.concurrent = None
+
+    def location(self, _id):
+        self.started.set()
+        self.concurrent = self.session.started.wait(5)
+        return [{"location": "lon", "status": "up", "code": 200, "rtt": 0.1, "time": 0.2}]
+
+
+class FakeResponse(object):
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class FakeSession(object):
+    def __init__(self):
+        self.started = threading.Event()
+        self.status = None
+        self.urls = []
+
+    def get(self, url, params=None):
+        self.urls.append(url)
+        self.started.set()
+        if self.status is not None:
+            self.status.started.wait(5)
+        return FakeResponse([{"id": "lon", "name": "London"}])
+
+
+def make_clients(metrics=None):
+    session = FakeSession()
+    api = FakeApi(devices=0, alerts=0)
+    api.services = Listing(SERVICES)
+    api.metrics = metrics or FakeMetrics()
+    api.service_status = FakeStatus(session)
+    return FakeClients(api, session)
+
+
+def make_wrapper(clients):
+    return Wrapper({}, fake_server(clients=clients))
+
+def test_location_metrics_one_request():
+    metrics = FakeMetrics()
+    wrapper = make_wrapper(make_clients(metrics))
+    now = datetime.now()
+    result = wrapper.location_metrics("s1", ["lon", "nyc", "sfo"], now - timedelta(minutes=30), now)
+    eq_(metrics.filters, [{"time": {"lon": "all", "nyc": "all", "sfo": "all"}}])
+    eq_([location["key"] for location in result], ["lon", "nyc", "sfo"])
+
+def test_location_metrics_fetches_left_out_locations():
+    metrics = FakeMetrics(left_out=["nyc"])
+    wrapper = make_wrapper(make_clients(metrics))
+    now = datetime.now()
+    result = wrapper.location_metrics("s1", ["sfo", "nyc", "lon"], now - timedelta(minutes=30), now)
+    eq_(metrics.filters[1:], [{"time": {"nyc": "all"}}])
+    eq_([location["key"] for location in result], ["sfo", "nyc", "lon"])
+
+def test_node_names_cached():
+    clients = make_clients()
+    wrapper = make_wrapper(clients)
+    eq_(wrapper.node_names(), {"lon": "London"})
+    eq_(wrapper.node_names(), {"lon": "London"})
+    eq_(len(clients.session.urls), 1)
+    assert clients.session.urls[0].endswith("/service-monitor/nodes")
+
+def test_status_and_nodes_fetched_concurrently():
+    clients = make_clients()
+    clients.session.status = clients.api().service_status
+    results, message = make_wrapper(clients).get_status("web")
+    eq_(clients.api().service_status.concurrent, True)
+    eq_([result["title"] for result in results], ["London"])
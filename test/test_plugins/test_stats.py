@@ -0,0 +1,33 @@
+# -*- coding: UTF-8 -*-
+import os
+import sys
+
+from nose.tools import eq_
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR, '../../limbo/plugins'))
+
+from stats import on_message
+import limbo
+from limbo.stats import STATS
+
+def test_nothing_timed():
+    STATS.reset()
+    server = limbo.FakeServer()
+    eq_(on_message({"text": u"sdbot stats"}, server), "I haven't timed anything yet")
+
+def test_slowest_first():
+    STATS.reset()
+    STATS.record("limbo_plugin_seconds", (("plugin", "devices"), ("command", "devices")), 0.1)
+    STATS.record("limbo_plugin_seconds", (("plugin", "graph"), ("command", "graph")), 2.0)
+    STATS.record("limbo_slack_seconds", (("method", "files.upload"),), 0.5, ok=False)
+    server = limbo.FakeServer()
+    ret = on_message({"text": u"sdbot stats"}, server)
+    lines = ret.strip("`").splitlines()
+    assert lines[1].startswith("graph graph")
+    assert lines[2].startswith("devices devices")
+    assert "files.upload" in ret and "100.0%" in ret
+
+def test_other_text():
+    server = limbo.FakeServer()
+    eq_(on_message({"text": u"sdbot statsy"}, server), None)
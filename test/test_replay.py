@@ -0,0 +1,40 @@
+# -*- coding: UTF-8 -*-
+import tempfile
+
+from nose.tools import eq_
+
+from limbo import replay
+
+
+def test_generate():
+    events = replay.generate(200, seed=1)
+    eq_(len(events), 200)
+    eq_(events, replay.generate(200, seed=1))
+    types = set(event["type"] for event in events)
+    eq_(types, set(["message", "channel_joined", "presence_change", "user_typing"]))
+
+def test_save_load():
+    events = replay.generate(20)
+    tf = tempfile.NamedTemporaryFile()
+    replay.save(events, tf.name)
+    eq_(replay.load(tf.name), events)
+
+def test_expects_reply():
+    assert replay.expects_reply({"type": "message", "text": "sdbot stats"})
+    assert replay.expects_reply({"type": "channel_joined", "channel": {"id": "C1"}})
+    assert not replay.expects_reply({"type": "message", "text": "lunch?"})
+    assert not replay.expects_reply({"type": "message", "subtype": "bot_message", "text": "sdbot stats"})
+
+def test_run():
+    events = []
+    for n in range(5):
+        events.append({"type": "message", "channel": "C{0}".format(n), "user": "2", "text": "sdbot stats"})
+        events.append({"type": "message", "channel": "C{0}".format(n), "user": "2", "text": "lunch?"})
+        events.append({"type": "presence_change", "user": "2", "presence": "away"})
+    config = {"plugins": "stats", "workers": 2, "outbox_interval": 0}
+    report = replay.run(events, rate=0, config=config, drain=0.2, timeout=30)
+    eq_(report["events"], 15)
+    eq_(report["replies"], 5)
+    eq_(report["unanswered"], 0)
+    assert report["events_per_second"] > 0
+    assert report["latency_p99"] >= report["latency_p50"] > 0
@@ -0,0 +1,115 @@
+# -*- coding: UTF-8 -*-
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen
+
+from nose.tools import eq_
+
+from limbo.fakeapi import Account
+from limbo.fakeapi import serve as serve_fakeapi
+from limbo.fakeserver import FakeServer
+from limbo.handlers import CommandRouter, handle_message, run_hooks
+from limbo.plugins.common.clients import ClientRegistry, PooledSession
+from limbo.stats import STATS, Stats, percentile, serve
+
+GRAPH = (("plugin", "graph"), ("command", "graph"))
+
+
+def test_percentile():
+    samples = list(range(1, 101))
+    eq_(percentile(samples, 0.5), 51)
+    eq_(percentile(samples, 0.99), 100)
+    eq_(percentile([], 0.5), 0.0)
+
+def test_summary():
+    stats = Stats()
+    for n in range(10):
+        stats.record("limbo_plugin_seconds", GRAPH, n / 10.0, ok=n != 0)
+    [(metric, labels, summary)] = stats.summaries()
+    eq_((metric, labels), ("limbo_plugin_seconds", GRAPH))
+    eq_(summary["count"], 10)
+    eq_(summary["errors"], 1)
+    eq_(summary["error_rate"], 0.1)
+    eq_(summary["p50"], 0.5)
+    eq_(summary["p99"], 0.9)
+
+def test_timed_counts_errors():
+    stats = Stats()
+    try:
+        with stats.timed("limbo_slack_seconds", (("method", "chat.postMessage"),)):
+            raise ValueError()
+    except ValueError:
+        pass
+    eq_(stats.summaries()[0][2]["errors"], 1)
+
+def test_prometheus():
+    stats = Stats()
+    stats.record("limbo_plugin_seconds", GRAPH, 0.25)
+    lines = stats.prometheus().splitlines()
+    assert "# TYPE limbo_plugin_seconds summary" in lines
+    assert 'limbo_plugin_seconds{plugin="graph",command="graph",quantile="0.5"} 0.25' in lines
+    assert 'limbo_plugin_seconds_count{plugin="graph",command="graph"} 1' in lines
+    assert 'limbo_plugin_errors_total{plugin="graph",command="graph"} 0' in lines
+
+def failing_hook(msg, server):
+    raise ValueError()
+
+def test_run_hooks_records_timing():
+    STATS.reset()
+    run_hooks([failing_hook], {}, None, command="graph")
+    [(metric, labels, summary)] = STATS.summaries()
+    eq_(labels, (("plugin", __name__), ("command", "graph")))
+    eq_(summary["errors"], 1)
+
+def chatter_hook(msg, server):
+    pass
+
+def test_unknown_commands_share_a_label():
+    STATS.reset()
+    router = CommandRouter()
+    router.add(failing_hook, ["graph"])
+    router.add(chatter_hook)
+    server = FakeServer(hooks={"router": router})
+    for text in (u"sdbot grpah cpu", u"sdbot gaph cpu", u"sdbot graph cpu"):
+        handle_message({"user": "2", "text": text}, server)
+    # both typos only reach chatter_hook, under the one "message" label
+    counts = sorted((dict(labels)["command"], summary["count"]) for _, labels, summary in STATS.summaries())
+    eq_(counts, [("graph", 2), ("message", 2)])
+
+def test_serve():
+    STATS.reset()
+    STATS.record("limbo_plugin_seconds", GRAPH, 0.25)
+    server = serve(0)
+    body = urlopen("http://127.0.0.1:{0}/metrics".format(server.server_port)).read()
+    assert b'limbo_plugin_seconds_count{plugin="graph",command="graph"} 1' in body
+
+def serverdensity_counts():
+    return dict((dict(labels)["endpoint"], summary["count"])
+                for _, labels, summary in STATS.summaries("limbo_serverdensity_seconds"))
+
+def test_serverdensity_calls_timed():
+    fakeapi = serve_fakeapi(Account(devices=2, services=1, alerts=1), port=0)
+    STATS.reset()
+    clients = ClientRegistry("token", base_url="http://127.0.0.1:{0}/".format(fakeapi.server_port))
+    eq_(len(clients.api().devices.list()), 2)
+    eq_(serverdensity_counts(), {"inventory/devices": 1})
+    # the session keeps timing after ApiClient mounts its own adapters
+    clients.api().devices.list()
+    eq_(serverdensity_counts(), {"inventory/devices": 2})
+    fakeapi.shutdown()
+
+def test_prepared_requests_timed():
+    # how ApiClient sends: mount an adapter, prepare, then send
+    fakeapi = serve_fakeapi(Account(devices=2), port=0)
+    STATS.reset()
+    session = PooledSession()
+    session.mount("http://", HTTPAdapter(max_retries=3))
+    url = "http://127.0.0.1:{0}/inventory/devices".format(fakeapi.server_port)
+    response = session.send(session.prepare_request(requests.Request("GET", url)), timeout=5)
+    eq_(response.status_code, 200)
+    eq_(serverdensity_counts(), {"inventory/devices": 1})
+    fakeapi.shutdown()
@@ -0,0 +1,17 @@
+# -*- coding: UTF-8 -*-
+from nose.tools import eq_
+
+from limbo.utils import run_concurrently
+
+def test_run_concurrently_keeps_order():
+    calls = [lambda n=n: n * 2 for n in range(10)]
+    eq_(run_concurrently(calls), [n * 2 for n in range(10)])
+
+def test_run_concurrently_raises():
+    def fail():
+        raise ValueError("nope")
+    try:
+        run_concurrently([lambda: 1, fail])
+    except ValueError:
+        return
+    1 / 0